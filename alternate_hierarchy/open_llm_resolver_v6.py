@@ -8,6 +8,7 @@ import openai as oai
 
 import config.configuration as cfg
 import oai_batch
+from shared_catalog import attach_hierarchy
 
 class AbstractSelectionWorkItem(oai_batch.WorkItem):
     def __init__(self):
@@ -616,8 +617,7 @@ EXTENDED DESCRIPTION: '{spt["EXTENDED DESCRIPTION"]}'
     }
 
 def main():
-    with open(os.path.join(cfg.get_settings().main_results_path_dir, "alternative_hierarchy_db.json"), 'rt', encoding='utf-8') as f:
-        alt_hierarchy_db = json.load(f)
+    alt_hierarchy_db = attach_hierarchy(os.path.join(cfg.get_settings().main_results_path_dir, "alternative_hierarchy_db.json"))
 
     request_offer_list = [
         {
@@ -0,0 +1,225 @@
+import asyncio
+import functools
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+import openai as oai
+from pybase64 import b64decode
+
+from embedding_cache import EmbeddingCache
+from flat_catalog import Collection, OpenAIEmbedder, token_batches
+
+
+class AsyncOpenAIEmbedder:
+    """
+    asyncio counterpart of OpenAIEmbedder: one AsyncOpenAI (HTTP) client
+    shared by all calls, token-bounded sub-batches sent concurrently, and the
+    same on-disk cache keys as the synchronous embedders.
+    """
+
+    max_inputs_per_request = OpenAIEmbedder.max_inputs_per_request
+    max_tokens_per_request = OpenAIEmbedder.max_tokens_per_request
+    max_retries = OpenAIEmbedder.max_retries
+    retry_base_delay = OpenAIEmbedder.retry_base_delay
+    retryable_errors = OpenAIEmbedder.retryable_errors
+
+    def __init__(
+        self,
+        model: str = OpenAIEmbedder.model,
+        dimensions: int | None = None,
+        cache: EmbeddingCache | None = None,
+        max_concurrency: int = 4,
+    ):
+        self.model = model
+        self.dimensions = dimensions
+        self.cache = cache
+        self.client = oai.AsyncOpenAI(max_retries=0)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def __call__(self, texts: str | List[str]) -> np.ndarray:
+        if isinstance(texts, str):
+            return (await self._embed([texts]))[0]
+        return await self._embed(list(texts))
+
+    async def _embed(self, texts: List[str]) -> np.ndarray:
+        if self.cache is None:
+            return await self._embed_uncached(texts)
+        # the cache is SQLite, so it is read and written off the event loop
+        cached, missing = await asyncio.to_thread(
+            self.cache.lookup, self.model, self.dimensions, texts
+        )
+        if missing:
+            new = await self._embed_uncached(missing)
+            return await asyncio.to_thread(
+                self.cache.fill,
+                self.model,
+                self.dimensions,
+                texts,
+                cached,
+                missing,
+                new,
+            )
+        return np.vstack(cached)
+
+    async def _embed_uncached(self, texts: List[str]) -> np.ndarray:
+        batches = token_batches(
+            texts, self.max_inputs_per_request, self.max_tokens_per_request
+        )
+        parts = await asyncio.gather(
+            *[self._embed_batch(texts[start:end]) for start, end in batches]
+        )
+        return np.vstack(parts)
+
+    async def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        extra = {} if self.dimensions is None else {"dimensions": self.dimensions}
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await self.client.embeddings.create(
+                        input=texts,
+                        model=self.model,
+                        encoding_format="base64",
+                        **extra,
+                    )
+                    break
+                except self.retryable_errors:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self.retry_base_delay * 2**attempt
+                    await asyncio.sleep(delay + random.uniform(0, delay))
+        rows = sorted(response.data, key=lambda r: r.index)
+        return np.vstack(
+            [
+                np.frombuffer(b64decode(r.embedding), dtype=np.float32)  # type: ignore
+                for r in rows
+            ]
+        )
+
+
+class _ExecutorFacade:
+    def __init__(self, executor: ThreadPoolExecutor | None, max_workers: int):
+        # CPU-bound search and blocking client calls run here, so that at most
+        # max_workers of them compete with the event loop at a time
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers)
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(fn, *args, **kwargs)
+        )
+
+
+class AsyncCatalog(_ExecutorFacade):
+    """
+    asyncio facade over catalog.Catalog. Query embeddings go through an
+    AsyncOpenAIEmbedder when the catalog embeds with OpenAI; Chroma/numpy
+    lookups run on the bounded executor, so independent levels can be
+    awaited together with asyncio.gather.
+    """
+
+    def __init__(
+        self,
+        catalog,
+        executor: ThreadPoolExecutor | None = None,
+        max_workers: int = 4,
+    ):
+        super().__init__(executor, max_workers)
+        self.catalog = catalog
+        self.embedder = None
+        if catalog.embedding_model.startswith("text-embedding-"):
+            self.embedder = AsyncOpenAIEmbedder(
+                model=catalog.embedding_model,
+                dimensions=getattr(catalog.embedding_function, "dimensions", None),
+                cache=getattr(catalog.embedding_function, "cache", None),
+            )
+
+    async def embed_documents(self, documents: List[str]) -> np.ndarray:
+        if self.embedder is None:
+            return await self._run(self.catalog.embed_documents, documents)
+        return await self.embedder(list(documents))
+
+    async def embed_document(self, document: str) -> np.ndarray:
+        return (await self.embed_documents([document]))[0]
+
+    async def query_category(self, query_embed: np.ndarray, *args, **kwargs):
+        return await self._run(
+            self.catalog.query_category, query_embed, *args, **kwargs
+        )
+
+    async def query_prod_family(self, query_embed: np.ndarray, *args, **kwargs):
+        return await self._run(
+            self.catalog.query_prod_family, query_embed, *args, **kwargs
+        )
+
+    async def query_prod_group(self, query_embed: np.ndarray, *args, **kwargs):
+        return await self._run(
+            self.catalog.query_prod_group, query_embed, *args, **kwargs
+        )
+
+    async def query_product(self, query_embed: np.ndarray, *args, **kwargs):
+        return await self._run(
+            self.catalog.query_product, query_embed, *args, **kwargs
+        )
+
+    async def query(self, query_embed: np.ndarray, n_results: int | None = None):
+        return await self._run(self.catalog.query, query_embed, n_results)
+
+    async def query_many(self, query_embeds, n_results: int | None = None):
+        return await self._run(self.catalog.query_many, query_embeds, n_results)
+
+    async def query_beam(self, query_embed: np.ndarray, beam_width=4, k=10):
+        return await self._run(self.catalog.query_beam, query_embed, beam_width, k)
+
+    async def fetch_metadata(self, collection: str, ids: List[str]):
+        return await self._run(self.catalog.fetch_metadata, collection, ids)
+
+    async def query_text(self, query_text: str, n_results: int | None = None):
+        return await self.query(await self.embed_document(query_text), n_results)
+
+
+class AsyncCollection(_ExecutorFacade):
+    """asyncio facade over flat_catalog.Collection (see AsyncCatalog)."""
+
+    def __init__(
+        self,
+        collection: Collection,
+        executor: ThreadPoolExecutor | None = None,
+        max_workers: int = 4,
+    ):
+        super().__init__(executor, max_workers)
+        self.collection = collection
+        self.embedder = None
+        if collection.backend == "openai":
+            self.embedder = AsyncOpenAIEmbedder(
+                model=collection.embedder.model,
+                dimensions=collection.embedder.dimensions,
+                cache=collection.cache,
+            )
+
+    async def embed(self, query_text: str) -> np.ndarray:
+        if self.embedder is None:
+            return await self._run(self.collection.embedder, query_text)
+        return await self.embedder(query_text)
+
+    async def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int | None = None,
+        min_score: float | None = None,
+        where: dict | None = None,
+    ):
+        return await self._run(
+            self.collection._search, query_embedding, top_k, min_score, where
+        )
+
+    async def search_many(self, query_matrix: np.ndarray, *args, **kwargs):
+        return await self._run(
+            self.collection.search_many, query_matrix, *args, **kwargs
+        )
+
+    async def search_items(
+        self, query_text: str, top_k: int | None = None, where: dict | None = None
+    ):
+        return await self.search(await self.embed(query_text), top_k, where=where)
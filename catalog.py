@@ -1,4 +1,6 @@
 __import__("pysqlite3")
+import hashlib
+import json
 import sys
 import os
 
@@ -11,12 +13,25 @@ from chromadb.config import Settings
 import chromadb.utils.embedding_functions as embedding_functions
 import numpy as np
 
+import config.configuration as cfg
+from embedding_cache import CachedEmbeddingFunction, EmbeddingCache, model_name_of
+from embedding_dispatcher import EmbeddingDispatcher
+from hierarchy_index import NumpyHierarchy
+from local_embedder import LocalEmbedder
+from query_cache import QueryCache, query_key
 
 os.environ["CHROMA_OPENAI_API_KEY"] = os.environ["OPENAI_API_KEY"]
 
+# metadata key holding sha256(embedding model + document text)
+CONTENT_HASH_KEY = "content_hash"
+
 
 def local_ef_init():
-    return embedding_functions.DefaultEmbeddingFunction()
+    settings = cfg.get_search_settings()
+    return LocalEmbedder(
+        num_threads=settings.local_embedding_threads,
+        batch_size=settings.local_embedding_batch_size,
+    )
 
 
 def openai_ef_init():
@@ -25,6 +40,28 @@ def openai_ef_init():
     )
 
 
+EMBEDDING_FUNCTION_INITS = {
+    "openai": openai_ef_init,
+    "local": local_ef_init,
+}
+
+
+def settings_ef_init():
+    settings = cfg.get_search_settings()
+    backend = settings.embedding_backends.get("catalog", settings.embedding_backend)
+    return EMBEDDING_FUNCTION_INITS[backend]()
+
+
+def hnsw_settings() -> dict:
+    """HNSW parameters of the catalog collections (see hnsw_benchmark.py)."""
+    settings = cfg.get_search_settings()
+    return {
+        "ef_construction": settings.hnsw_ef_construction,
+        "max_neighbors": settings.hnsw_max_neighbors,
+        "ef_search": settings.hnsw_ef_search,
+    }
+
+
 def build_where_clause(field: str, values: List[str] | str | None):
     if values is None:
         return None
@@ -34,27 +71,58 @@ def build_where_clause(field: str, values: List[str] | str | None):
 
 
 class Catalog:
-    def __init__(self, path: str, embedding_function_init=openai_ef_init):
+    # result depth and fields of per-level queries unless a call asks for more
+    default_n_results = 10
+    default_include = ("distances", "metadatas")
+
+    def __init__(
+        self,
+        path: str,
+        embedding_function_init=settings_ef_init,
+        embedding_cache: EmbeddingCache | None = None,
+        search_backend: str | None = None,
+        hnsw: dict | None = None,
+    ):
         settings = Settings(
             anonymized_telemetry=False,
             allow_reset=True,
         )
+        self.path = path
+        # "chroma" queries the HNSW collections, "numpy" an in-memory copy of
+        # all levels (NumpyHierarchy) loaded on first query
+        if search_backend is None:
+            search_backend = cfg.get_search_settings().catalog_search_backend
+        self.search_backend = search_backend
+        if self.search_backend not in ("chroma", "numpy"):
+            raise ValueError(f"Unknown search backend {self.search_backend}")
+        self._hierarchy: NumpyHierarchy | None = None
+        self._hierarchy_version: tuple | None = None
+        # results of per-level queries, dropped when the collections change
+        self.query_cache = QueryCache.from_settings()
+        self._writes = 0
         self.client = chromadb.PersistentClient(
             path=path,
             settings=settings,
         )
         self.embedding_function = embedding_function_init()
+        self.embedding_model = model_name_of(self.embedding_function)
+        if embedding_cache is not None:
+            self.embedding_function = CachedEmbeddingFunction(
+                self.embedding_function, embedding_cache
+            )
+        # query texts of concurrent sessions sharing this catalog are batched
+        self._dispatcher = EmbeddingDispatcher.from_settings(self.embed_documents)
 
-        configuration = {
-            "hnsw": {
-                "space": "cosine",
-                "ef_construction": 1000,
-            }
-        }
+        # ef_construction and max_neighbors only apply when a collection is
+        # created; ef_search is updated on existing collections too
+        if hnsw is None:
+            hnsw = hnsw_settings()
+        configuration = {"hnsw": {"space": "cosine", **hnsw}}
         self.collections = {
             name: self.client.get_or_create_collection(
                 name=name,
                 configuration=configuration,  # type: ignore
+                metadata={"embedding_model": self.embedding_model},
                 embedding_function=None,
             )
             for name in [
@@ -64,9 +132,44 @@ class Catalog:
                 "product",
             ]
         }
+        ef_search = hnsw.get("ef_search")
+        for collection in self.collections.values():
+            current = (collection.configuration.get("hnsw") or {}).get("ef_search")
+            if ef_search is not None and current != ef_search:
+                update = {"hnsw": {"ef_search": ef_search}}
+                collection.modify(configuration=update)  # type: ignore
+        for name, collection in self.collections.items():
+            # collections created before the model was recorded are OpenAI ones
+            built_with = (collection.metadata or {}).get(
+                "embedding_model", "text-embedding-3-large"
+            )
+            if built_with != self.embedding_model:
+                raise ValueError(
+                    f"Collection {name} was built with {built_with}, "
+                    f"not {self.embedding_model}"
+                )
+
+    @property
+    def nbytes(self) -> int:
+        # Chroma keeps the HNSW segments of queried collections in memory;
+        # their on-disk size is the closest available estimate
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(self.path)
+            for name in names
+        )
+
+    def embed_documents(self, documents: List[str]) -> np.ndarray:
+        """Embeddings of many documents in one batched call, in input order."""
+        return np.vstack(self.embedding_function(list(documents)))
 
     def embed_document(self, document: str) -> np.ndarray:
-        return self.embedding_function([document])[0]
+        return self._dispatcher.embed(document)
+
+    def content_hash(self, document: str) -> str:
+        return hashlib.sha256(
+            f"{self.embedding_model}\0{document}".encode("utf-8")
+        ).hexdigest()
 
     def upsert_documents(
         self,
@@ -74,90 +177,281 @@ class Catalog:
         ids: List[str],
         documents: List[str],
         metadatas: List[dict],
-    ):
+    ) -> dict:
+        """
+        Embed and upsert only documents whose text (or the embedding model)
+        changed since the last ingest, detected by the content hash stored
+        in their metadata. Records whose text is unchanged only get their
+        metadata refreshed when it differs.
+        """
         assert len(ids) == len(documents) == len(metadatas)
-        self.collections[collection].upsert(
-            ids=ids,
-            documents=documents,
-            metadatas=metadatas,  # type: ignore
-            embeddings=self.embedding_function(documents),
-        )
+        col = self.collections[collection]
+        existing = col.get(ids=list(ids), include=["metadatas"])
+        stored = dict(zip(existing["ids"], existing["metadatas"]))  # type: ignore
+
+        metadatas = [
+            {**m, CONTENT_HASH_KEY: self.content_hash(d)}
+            for d, m in zip(documents, metadatas)
+        ]
+        changed, refreshed = [], []
+        for i, (id, meta) in enumerate(zip(ids, metadatas)):
+            old = stored.get(id)
+            if old is None or old.get(CONTENT_HASH_KEY) != meta[CONTENT_HASH_KEY]:
+                changed.append(i)
+            # compared as JSON so that NaN values from pandas compare equal
+            elif json.dumps(old, sort_keys=True) != json.dumps(meta, sort_keys=True):
+                refreshed.append(i)
+
+        if changed:
+            changed_documents = [documents[i] for i in changed]
+            col.upsert(
+                ids=[ids[i] for i in changed],
+                documents=changed_documents,
+                metadatas=[metadatas[i] for i in changed],  # type: ignore
+                embeddings=self.embedding_function(changed_documents),
+            )
+        if refreshed:
+            col.update(
+                ids=[ids[i] for i in refreshed],
+                metadatas=[metadatas[i] for i in refreshed],  # type: ignore
+            )
+        if changed or refreshed:
+            self._data_changed()
+        return {
+            "embedded": len(changed),
+            "metadata_updated": len(refreshed),
+            "unchanged": len(ids) - len(changed) - len(refreshed),
+        }
+
+    def delete_missing(self, collection: str, keep_ids: List[str]) -> int:
+        """Delete records whose ids are no longer in the source; returns how many."""
+        col = self.collections[collection]
+        keep = set(keep_ids)
+        stale = [id for id in col.get(include=[])["ids"] if id not in keep]
+        if stale:
+            col.delete(ids=stale)
+            self._data_changed()
+        return len(stale)
+
+    def _data_changed(self):
+        self._hierarchy = None
+        self._writes += 1
+
+    def _data_version(self) -> tuple:
+        # writes of this instance, and of other processes (e.g. an ingest run
+        # next to the app) as seen in the modification times of Chroma's files
+        stamps = []
+        for name in ["chroma.sqlite3", "chroma.sqlite3-wal"]:
+            try:
+                stamps.append(os.stat(os.path.join(self.path, name)).st_mtime_ns)
+            except FileNotFoundError:
+                stamps.append(None)
+        return (self._writes, *stamps)
+
+    @property
+    def hierarchy(self) -> NumpyHierarchy:
+        # reloaded after writes of this or another process (see _data_version)
+        version = self._data_version()
+        if self._hierarchy is None or version != self._hierarchy_version:
+            self._hierarchy = NumpyHierarchy.from_collections(self.collections)
+            self._hierarchy_version = version
+        return self._hierarchy
 
     def _query_subcollection(
         self,
         collection: str,
         query_embed: np.ndarray,
         where: dict | None,
+        n_results: int | None = None,
+        include: List[str] | None = None,
+    ):
+        """
+        Returns (ids, metadatas, distances); fields left out of include are
+        None. Use fetch_metadata to load metadata for the rows shown.
+        """
+        return self._query_subcollection_many(
+            collection, [query_embed], where, n_results, include
+        )[0]
+
+    def _query_subcollection_many(
+        self,
+        collection: str,
+        query_embeds,
+        where: dict | None,
+        n_results: int | None = None,
+        include: List[str] | None = None,
+    ):
+        """One lookup for many embeddings sharing a where clause."""
+        if include is None:
+            include = list(self.default_include)
+        n_results = n_results or self.default_n_results
+        self.query_cache.validate(self._data_version())
+        keys = [
+            query_key(q, collection, where, n_results, sorted(include))
+            for q in query_embeds
+        ]
+        outputs = [self.query_cache.get(key) for key in keys]
+        missing = [i for i, output in enumerate(outputs) if output is None]
+        if missing:
+            results = self._query_uncached(
+                collection,
+                [query_embeds[i] for i in missing],
+                where,
+                n_results,
+                include,
+            )
+            for i, result in zip(missing, results):
+                self.query_cache.put(keys[i], result)
+                outputs[i] = result
+        # copies, so that callers editing the results do not edit the cache
+        return [
+            (
+                list(ids),
+                None if metas is None else [dict(m) for m in metas],
+                None if dists is None else list(dists),
+            )
+            for ids, metas, dists in outputs
+        ]
+
+    def _query_uncached(
+        self,
+        collection: str,
+        query_embeds,
+        where: dict | None,
+        n_results: int,
+        include: List[str],
     ):
+        if self.search_backend == "numpy":
+            return [
+                self.hierarchy.query(collection, q, where, n_results, include)
+                for q in query_embeds
+            ]
         result = self.collections[collection].query(
-            query_embeddings=[query_embed],
-            include=["distances", "metadatas"],
+            query_embeddings=list(query_embeds),
+            include=include,  # type: ignore
             where=where,
-            n_results=1000,
+            n_results=n_results,
         )
-        ids = result["ids"][0]
-        metas = result["metadatas"][0]  # type: ignore
-        dists = result["distances"][0]  # type: ignore
-        return ids, metas, dists
+        outputs = []
+        for i, ids in enumerate(result["ids"]):
+            metas, dists = None, None
+            if "metadatas" in include:
+                metas = result["metadatas"][i]  # type: ignore
+            if "distances" in include:
+                dists = result["distances"][i]  # type: ignore
+            outputs.append((ids, metas, dists))
+        return outputs
 
-    def query_category(self, query_embed: np.ndarray, _: str | List[str] | None = None):
+    def fetch_metadata(self, collection: str, ids: List[str]) -> List[dict]:
+        """Metadata of the given ids, in the same order."""
+        if len(ids) == 0:
+            return []
+        if self.search_backend == "numpy":
+            return self.hierarchy.fetch_metadata(collection, ids)
+        result = self.collections[collection].get(ids=list(ids), include=["metadatas"])
+        by_id = dict(zip(result["ids"], result["metadatas"]))  # type: ignore
+        return [dict(by_id[id]) for id in ids]
+
+    def query_category(
+        self,
+        query_embed: np.ndarray,
+        _: str | List[str] | None = None,
+        n_results: int | None = None,
+        include: List[str] | None = None,
+    ):
         return self._query_subcollection(
             collection="category",
             query_embed=query_embed,
             where=None,
+            n_results=n_results,
+            include=include,
         )
 
     def query_prod_family(
-        self, query_embed: np.ndarray, category: str | List[str] | None = None
+        self,
+        query_embed: np.ndarray,
+        category: str | List[str] | None = None,
+        n_results: int | None = None,
+        include: List[str] | None = None,
     ):
         return self._query_subcollection(
             collection="prod_family",
             query_embed=query_embed,
             where=build_where_clause("parent", category),
+            n_results=n_results,
+            include=include,
         )
 
     def query_prod_group(
-        self, query_embed: np.ndarray, prod_family: str | List[str] | None = None
+        self,
+        query_embed: np.ndarray,
+        prod_family: str | List[str] | None = None,
+        n_results: int | None = None,
+        include: List[str] | None = None,
     ):
         return self._query_subcollection(
             collection="prod_group",
             query_embed=query_embed,
             where=build_where_clause("parent", prod_family),
+            n_results=n_results,
+            include=include,
         )
 
     def query_product(
-        self, query_embed: np.ndarray, prod_group: str | List[str] | None = None
+        self,
+        query_embed: np.ndarray,
+        prod_group: str | List[str] | None = None,
+        n_results: int | None = None,
+        include: List[str] | None = None,
     ):
         return self._query_subcollection(
             collection="product",
             query_embed=query_embed,
             where=build_where_clause("parent", prod_group),
+            n_results=n_results,
+            include=include,
         )
 
-    def query(self, query_embed: np.ndarray):
-        category = self.query_category(query_embed, None)
-        prod_family = self.query_prod_family(query_embed, category[0][0])
-        prod_group = self.query_prod_group(query_embed, prod_family[0][0])
-        product_result = self.query_product(query_embed, prod_group[0][0])
-        return {
-            "category": {
-                "ids": category[0],
-                "metadatas": category[1],
-                "distances": category[2],
-            },
-            "prod_family": {
-                "ids": prod_family[0],
-                "metadatas": prod_family[1],
-                "distances": prod_family[2],
-            },
-            "prod_group": {
-                "ids": prod_group[0],
-                "metadatas": prod_group[1],
-                "distances": prod_group[2],
-            },
-            "product": {
-                "ids": product_result[0],
-                "metadatas": product_result[1],
-                "distances": product_result[2],
-            },
-        }
+    def query_beam(self, query_embed: np.ndarray, beam_width: int = 4, k: int = 10):
+        """
+        Ranked products with their category->family->group path, keeping the
+        beam_width best paths per level instead of only the best parent.
+        Runs on the in-memory copy of the catalog (see NumpyHierarchy).
+        """
+        return self.hierarchy.beam_search(query_embed, beam_width, k)
+
+    def query(self, query_embed: np.ndarray, n_results: int | None = None):
+        return self.query_many([query_embed], n_results)[0]
+
+    def query_many(self, query_embeds, n_results: int | None = None) -> List[dict]:
+        """
+        Catalog.query for many embeddings, in input order. Each level is one
+        lookup per distinct parent chosen by the previous level rather than
+        one per query.
+        """
+        query_embeds = list(query_embeds)
+        levels = ["category", "prod_family", "prod_group", "product"]
+        results: List[dict] = [{} for _ in query_embeds]
+        parents: List[str | None] = [None] * len(query_embeds)
+        for level in levels:
+            # only the best parent of each level is followed down
+            level_n_results = n_results if level == "product" else 1
+            by_parent: dict[str | None, List[int]] = {}
+            for i, parent in enumerate(parents):
+                by_parent.setdefault(parent, []).append(i)
+            for parent, indices in by_parent.items():
+                outputs = self._query_subcollection_many(
+                    level,
+                    [query_embeds[i] for i in indices],
+                    build_where_clause("parent", parent),
+                    level_n_results,
+                )
+                for i, (ids, metas, dists) in zip(indices, outputs):
+                    results[i][level] = {
+                        "ids": ids,
+                        "metadatas": metas,
+                        "distances": dists,
+                    }
+            # a query whose level came back empty matches no children below
+            parents = [(r[level]["ids"] or [""])[0] for r in results]
+        return results
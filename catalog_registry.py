@@ -0,0 +1,134 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable
+
+import config.configuration as cfg
+from embedding_cache import EmbeddingCache
+from flat_catalog import META_FILE, Collection
+from flat_group_search import GROUP_INDEX_FILE, GroupSearch
+
+
+def open_catalog(path: str, cache: EmbeddingCache | None = None):
+    """Open a catalog directory as whichever kind of catalog it holds."""
+    if os.path.isfile(os.path.join(path, GROUP_INDEX_FILE)):
+        return GroupSearch.load(path, cache=cache)
+    if os.path.isfile(os.path.join(path, META_FILE)):
+        return Collection(path, cache=cache)
+    # imported here: catalog pulls in chromadb and requires OPENAI_API_KEY
+    from catalog import Catalog
+
+    return Catalog(path, embedding_cache=cache)
+
+
+class CatalogRegistry:
+    """
+    Maps catalog ids to Collection/GroupSearch/Catalog instances. Catalogs are
+    opened on first use and the least recently used ones are dropped once the
+    resident bytes (see the nbytes properties) exceed memory_budget_bytes.
+    The catalog being returned is never evicted, even when it alone is over
+    budget.
+    """
+
+    def __init__(
+        self,
+        openers: dict[str, Callable[[], Any]] | None = None,
+        memory_budget_bytes: int | None = None,
+    ):
+        self.openers = dict(openers or {})
+        self.memory_budget_bytes = memory_budget_bytes
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self._resident: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self._opening: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, cache: EmbeddingCache | None = None) -> "CatalogRegistry":
+        settings = cfg.get_search_settings()
+        budget = settings.catalog_memory_budget_mb
+        return cls(
+            openers={
+                catalog_id: lambda path=path: open_catalog(path, cache)
+                for catalog_id, path in settings.catalogs.items()
+            },
+            memory_budget_bytes=None if budget is None else budget * 1024 * 1024,
+        )
+
+    def register(self, catalog_id: str, opener: Callable[[], Any]):
+        with self._lock:
+            self.openers[catalog_id] = opener
+            self._resident.pop(catalog_id, None)
+
+    def _resident_hit(self, catalog_id: str):
+        if catalog_id in self._resident:
+            self._resident.move_to_end(catalog_id)
+            self.hits += 1
+            return self._resident[catalog_id][0]
+        return None
+
+    def get(self, catalog_id: str):
+        with self._lock:
+            catalog = self._resident_hit(catalog_id)
+            if catalog is not None:
+                return catalog
+            if catalog_id not in self.openers:
+                raise KeyError(f"Unknown catalog {catalog_id}")
+            open_lock = self._opening.setdefault(catalog_id, threading.Lock())
+        # opened outside the registry lock so that a slow open does not block
+        # hits on other catalogs; concurrent first queries of the same one
+        # wait for the first open
+        with open_lock:
+            with self._lock:
+                catalog = self._resident_hit(catalog_id)
+                if catalog is not None:
+                    return catalog
+                opener = self.openers[catalog_id]
+            catalog = opener()
+            nbytes = getattr(catalog, "nbytes", 0)
+            with self._lock:
+                self.loads += 1
+                # not cached when the catalog was re-registered meanwhile
+                if self.openers.get(catalog_id) is opener:
+                    self._resident[catalog_id] = (catalog, nbytes)
+                    self._evict(keep=catalog_id)
+            return catalog
+
+    def __getitem__(self, catalog_id: str):
+        return self.get(catalog_id)
+
+    def evict(self, catalog_id: str) -> bool:
+        with self._lock:
+            if self._resident.pop(catalog_id, None) is None:
+                return False
+            self.evictions += 1
+            return True
+
+    def _evict(self, keep: str):
+        if self.memory_budget_bytes is None:
+            return
+        while self.resident_bytes > self.memory_budget_bytes:
+            oldest = next(iter(self._resident))
+            if oldest == keep:
+                break
+            del self._resident[oldest]
+            self.evictions += 1
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(nbytes for _, nbytes in self._resident.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loads": self.loads,
+                "hits": self.hits,
+                "evictions": self.evictions,
+                "resident_bytes": self.resident_bytes,
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "resident": {
+                    catalog_id: nbytes
+                    for catalog_id, (_, nbytes) in self._resident.items()
+                },
+            }
@@ -2,7 +2,48 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
 
 
-class Settings(BaseSettings):
+class SearchSettings(BaseSettings):
+    """
+    Settings of the catalogs, collections and embedders. All have defaults,
+    so search code can read them without the scraping/resolver settings.
+    """
+
+    # embedding backend ("openai" or "local") used when a collection does not
+    # record one yet; embedding_backends overrides it per collection name
+    embedding_backend: str = "openai"
+    embedding_backends: dict[str, str] = {}
+    local_embedding_threads: int | None = None
+    local_embedding_batch_size: int = 32
+    # query texts from concurrent sessions arriving within this window are
+    # embedded in one request (see embedding_dispatcher)
+    embedding_batch_window_ms: float = 15.0
+    embedding_batch_timeout_s: float | None = 10.0
+
+    # catalog id -> Chroma or catalog_db2-style directory, opened on demand by
+    # catalog_registry.CatalogRegistry and evicted LRU beyond the budget
+    catalogs: dict[str, str] = {}
+    catalog_memory_budget_mb: int | None = None
+    # catalog.Catalog search backend: "chroma" (HNSW) or "numpy" (in memory)
+    catalog_search_backend: str = "chroma"
+    # HNSW parameters of the Chroma catalog, picked with hnsw_benchmark.py
+    hnsw_ef_construction: int = 1000
+    hnsw_max_neighbors: int = 16
+    hnsw_ef_search: int = 100
+    # per-catalog/collection LRU of query results (see query_cache); 0 entries
+    # disables it
+    query_cache_size: int = 1024
+    query_cache_ttl_s: float | None = 300.0
+    query_cache_max_mb: int | None = 64
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        case_sensitive=False,
+        extra="ignore"  # Ignore extra fields in .env
+    )
+
+
+class Settings(SearchSettings):
     """
     Application settings loaded from environment variables.
     Add your configuration fields here with type hints.
@@ -22,13 +63,6 @@ class Settings(BaseSettings):
     hierarchy_inference_model_name: str
     customer_description_expansion_model_name: str
 
-    model_config = SettingsConfigDict(
-        env_file=".env",
-        env_file_encoding="utf-8",
-        case_sensitive=False,
-        extra="ignore"  # Ignore extra fields in .env
-    )
-
 
 @lru_cache
 def get_settings() -> Settings:
@@ -38,3 +72,9 @@ def get_settings() -> Settings:
     """
     return Settings()
 
+
+@lru_cache
+def get_search_settings() -> SearchSettings:
+    """Like get_settings, limited to SearchSettings (no required fields)."""
+    return SearchSettings()
+
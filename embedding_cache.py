@@ -0,0 +1,153 @@
+import hashlib
+import sqlite3
+import threading
+from typing import Callable, List
+
+import numpy as np
+
+DEFAULT_CACHE_PATH = "embedding_cache.sqlite3"
+
+# keep well below SQLite's host parameter limit
+_QUERY_CHUNK = 500
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def model_name_of(embedding_function) -> str:
+    for attr in ["model_name", "model"]:
+        value = getattr(embedding_function, attr, None)
+        if isinstance(value, str):
+            return value
+    return type(embedding_function).__name__
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (model, dimensions, sha256(text)).
+    Embeddings are stored as raw float32 blobs.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                text_hash BLOB NOT NULL,
+                embedding BLOB NOT NULL,
+                PRIMARY KEY (model, dimensions, text_hash)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.commit()
+
+    def get_many(
+        self, model: str, dimensions: int | None, texts: List[str]
+    ) -> List[np.ndarray | None]:
+        hashes = [text_hash(t) for t in texts]
+        found = {}
+        with self._lock:
+            for i in range(0, len(hashes), _QUERY_CHUNK):
+                chunk = list(set(hashes[i : i + _QUERY_CHUNK]))
+                rows = self._conn.execute(
+                    "SELECT text_hash, embedding FROM embeddings "
+                    "WHERE model = ? AND dimensions = ? AND text_hash IN "
+                    f"({','.join('?' * len(chunk))})",
+                    [model, dimensions or 0, *chunk],
+                ).fetchall()
+                found.update(rows)
+        return [
+            np.frombuffer(found[h], dtype=np.float32) if h in found else None
+            for h in hashes
+        ]
+
+    def put_many(
+        self,
+        model: str,
+        dimensions: int | None,
+        texts: List[str],
+        embeddings: np.ndarray,
+    ):
+        rows = [
+            (model, dimensions or 0, text_hash(t), np.asarray(e, np.float32).tobytes())
+            for t, e in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def embed(
+        self,
+        model: str,
+        dimensions: int | None,
+        texts: List[str],
+        embed_fn: Callable[[List[str]], np.ndarray],
+    ) -> np.ndarray:
+        """Return embeddings for texts, calling embed_fn only for cache misses."""
+        cached, missing = self.lookup(model, dimensions, texts)
+        if missing:
+            new = np.asarray(embed_fn(missing), dtype=np.float32)
+            return self.fill(model, dimensions, texts, cached, missing, new)
+        return np.vstack(cached)
+
+    def lookup(self, model: str, dimensions: int | None, texts: List[str]):
+        """Cached embeddings (None for misses) and the distinct missing texts."""
+        cached = self.get_many(model, dimensions, texts)
+        missing = list(dict.fromkeys(t for t, e in zip(texts, cached) if e is None))
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        return cached, missing
+
+    def fill(
+        self,
+        model: str,
+        dimensions: int | None,
+        texts: List[str],
+        cached: List[np.ndarray | None],
+        missing: List[str],
+        new: np.ndarray,
+    ) -> np.ndarray:
+        """Store embeddings of the missing texts and complete the lookup."""
+        self.put_many(model, dimensions, missing, new)
+        new_by_text = dict(zip(missing, new))
+        return np.vstack(
+            [new_by_text[t] if e is None else e for t, e in zip(texts, cached)]
+        )
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class CachedEmbeddingFunction:
+    """Wraps a Chroma embedding function with an EmbeddingCache."""
+
+    def __init__(self, embedding_function, cache: EmbeddingCache):
+        self.embedding_function = embedding_function
+        self.cache = cache
+        self.model = model_name_of(embedding_function)
+        self.dimensions = getattr(embedding_function, "dimensions", None)
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        embeddings = self.cache.embed(
+            self.model,
+            self.dimensions,
+            list(input),
+            lambda texts: np.vstack(self.embedding_function(texts)),
+        )
+        return list(embeddings)
@@ -0,0 +1,152 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+import numpy as np
+
+import config.configuration as cfg
+
+
+class EmbeddingDispatcher:
+    """
+    Collects single query texts submitted by concurrent callers (sessions)
+    within window_ms of the first one and embeds them in one request. Each
+    caller waits on its own future; on timeout or a failed batch it embeds
+    its text directly instead. The worker thread only runs while texts are
+    queued, so an idle dispatcher does not keep its embedder alive.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[list[str]], np.ndarray],
+        window_ms: float = 15.0,
+        max_batch: int = 256,
+        timeout: float | None = 10.0,
+    ):
+        self.embed_fn = embed_fn
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.requests = 0
+        self.batches = 0
+        self.fallbacks = 0
+        self._queue: list[tuple[str, Future]] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._worker: threading.Thread | None = None
+
+    @classmethod
+    def from_settings(
+        cls, embed_fn: Callable[[list[str]], np.ndarray]
+    ) -> "EmbeddingDispatcher":
+        settings = cfg.get_search_settings()
+        return cls(
+            embed_fn,
+            window_ms=settings.embedding_batch_window_ms,
+            timeout=settings.embedding_batch_timeout_s,
+        )
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("dispatcher is closed")
+            self._queue.append((text, future))
+            self.requests += 1
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+            self._cond.notify()
+        return future
+
+    def embed(self, text: str, timeout: float | None = None) -> np.ndarray:
+        future = self.submit(text)
+        try:
+            return future.result(self.timeout if timeout is None else timeout)
+        except Exception:
+            # a slow or failed batch must not fail the caller; a cancelled
+            # future is skipped by the worker if its batch has not started
+            future.cancel()
+            with self._cond:
+                self.fallbacks += 1
+            return np.asarray(self.embed_fn([text]))[0]
+
+    def _take_batch(self) -> list[tuple[str, Future]]:
+        with self._cond:
+            if not self._queue:
+                # the next submit starts a new worker
+                self._worker = None
+                return []
+            deadline = time.monotonic() + self.window_ms / 1000.0
+            while len(self._queue) < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._queue[: self.max_batch]
+            self._queue = self._queue[self.max_batch :]
+            return batch
+
+    def _run(self):
+        while batch := self._take_batch():
+            # callers that already gave up need no embedding
+            batch = [(t, f) for t, f in batch if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            texts = list(dict.fromkeys(t for t, _ in batch))
+            try:
+                embeddings = np.asarray(self.embed_fn(texts))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            by_text = dict(zip(texts, embeddings))
+            for text, future in batch:
+                future.set_result(by_text[text])
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            worker = self._worker
+        if worker is not None:
+            worker.join()
+
+    def stats(self) -> dict:
+        with self._cond:
+            batches = self.batches
+            return {
+                "requests": self.requests,
+                "batches": batches,
+                "fallbacks": self.fallbacks,
+                "texts_per_batch": self.requests / batches if batches else 0.0,
+            }
+
+
+class DispatchingEmbedder:
+    """
+    Embedder wrapper that routes single query strings through a dispatcher
+    and passes lists (ingestion) straight to the wrapped embedder.
+    """
+
+    def __init__(self, embedder, dispatcher: EmbeddingDispatcher):
+        self.embedder = embedder
+        self.dispatcher = dispatcher
+        self.model = embedder.model
+        self.embed_size = embedder.embed_size
+        self.dimensions = embedder.dimensions
+
+    def __call__(self, texts: str | list[str]):
+        if isinstance(texts, str):
+            return self.dispatcher.embed(texts)
+        return self.embedder(texts)
+
+
+def dispatching(embedder) -> DispatchingEmbedder:
+    """
+    Wrap embedder with a dispatcher of its own; sessions sharing the wrapped
+    embedder (one per process, see resources) share its batches.
+    """
+    return DispatchingEmbedder(embedder, EmbeddingDispatcher.from_settings(embedder))
@@ -1,16 +1,74 @@
+import json
+import mmap
 import os
+import random
+import time
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 
 import numpy as np
+import openai as oai
 from openai import OpenAI
 from pybase64 import b64decode
 
+import config.configuration as cfg
+import lexical_index
+from embedding_cache import EmbeddingCache
+from ivf_index import IVFIndex
+from lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+from local_embedder import LocalEmbedder
+from metadata_filter import AttributeIndex
+from query_cache import QueryCache, query_key
+
+
+def estimate_tokens(text: str) -> int:
+    # upper bound without a tokenizer dependency: a BPE token covers at least
+    # one byte, so there are never more tokens than UTF-8 bytes
+    return len(text.encode("utf-8"))
+
+
+def token_batches(texts: list[str], max_inputs: int, max_tokens: int):
+    """Split texts into consecutive (start, end) ranges bounded by count and tokens."""
+    batches = []
+    start, tokens = 0, 0
+    for i, text in enumerate(texts):
+        n = estimate_tokens(text)
+        if i > start and (i - start >= max_inputs or tokens + n > max_tokens):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += n
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
 
 class OpenAIEmbedder:
+    model = "text-embedding-3-large"
     embed_size = 3072
+    max_inputs_per_request = 512
+    max_tokens_per_request = 100_000
+    max_workers = 4
+    max_retries = 6
+    retry_base_delay = 1.0
+    retryable_errors = (
+        oai.RateLimitError,
+        oai.APITimeoutError,
+        oai.APIConnectionError,
+        oai.InternalServerError,
+    )
 
-    def __init__(self):
+    def __init__(
+        self, dimensions: int | None = None, cache: EmbeddingCache | None = None
+    ):
         assert os.environ.get("OPENAI_API_KEY") is not None
-        self.client = OpenAI()
+        # retries are handled per sub-batch in _embed_batch
+        self.client = OpenAI(max_retries=0)
+        self.cache = cache
+        # text-embedding-3 models return shortened (Matryoshka) embeddings on request
+        self.dimensions = dimensions
+        if dimensions is not None:
+            self.embed_size = dimensions
 
     def __call__(self, texts: str | list[str]):
         if isinstance(texts, str):
@@ -18,37 +76,299 @@ class OpenAIEmbedder:
         return self._embed(texts)
 
     def _embed(self, texts: list[str]):
-        response = self.client.embeddings.create(
-            input=[t for t in texts],
-            model="text-embedding-3-large",
-            encoding_format="base64",
+        if self.cache is not None:
+            return self.cache.embed(
+                self.model, self.dimensions, texts, self._embed_uncached
+            )
+        return self._embed_uncached(texts)
+
+    def _embed_uncached(self, texts: list[str]):
+        embeddings = np.empty((len(texts), self.embed_size), dtype=np.float32)
+        batches = token_batches(
+            texts, self.max_inputs_per_request, self.max_tokens_per_request
         )
-        embeds_b64 = [r.embedding for r in response.data]
-        embeds_bytes = [b64decode(e) for e in embeds_b64]  # type: ignore
-        embeds_floats = [np.frombuffer(e, dtype=np.float32) for e in embeds_bytes]
-        embeddings = np.vstack(embeds_floats)
+        if len(batches) == 1:
+            self._embed_batch(texts, embeddings, *batches[0])
+            return embeddings
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(self._embed_batch, texts, embeddings, start, end)
+                for start, end in batches
+            ]
+            for future in futures:
+                future.result()
+        return embeddings
+
+    def _embed_batch(self, texts: list[str], out: np.ndarray, start: int, end: int):
+        extra = {} if self.dimensions is None else {"dimensions": self.dimensions}
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.client.embeddings.create(
+                    input=texts[start:end],
+                    model=self.model,
+                    encoding_format="base64",
+                    **extra,
+                )
+                break
+            except self.retryable_errors:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_base_delay * 2**attempt
+                time.sleep(delay + random.uniform(0, delay))
+        # decode straight into the preallocated output rows
+        for r in response.data:
+            out[start + r.index] = np.frombuffer(
+                b64decode(r.embedding),  # type: ignore
+                dtype=np.float32,
+            )
+
+
+def default_backend(name: str | None) -> str:
+    settings = cfg.get_search_settings()
+    return settings.embedding_backends.get(name or "", settings.embedding_backend)
+
+
+def make_embedder(
+    backend: str,
+    dimensions: int | None = None,
+    cache: EmbeddingCache | None = None,
+):
+    if backend == "openai":
+        return OpenAIEmbedder(dimensions=dimensions, cache=cache)
+    if backend == "local":
+        settings = cfg.get_search_settings()
+        return LocalEmbedder(
+            num_threads=settings.local_embedding_threads,
+            batch_size=settings.local_embedding_batch_size,
+            cache=cache,
+        )
+    raise ValueError(f"Unknown embedding backend {backend}")
+
+
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+ITEMS_FILE = "items.jsonl"
+ITEM_OFFSETS_FILE = "item_offsets.npy"
+COARSE_FILE = "coarse.npy"
+COARSE_SCALES_FILE = "coarse_scales.npy"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_OFFSETS_FILE = "ivf_offsets.npy"
+IVF_ROWS_FILE = "ivf_rows.npy"
+
+
+def _replace_file(path: str, write_fn):
+    # write to a temporary file and swap it in, so processes that still have
+    # the old file memory-mapped keep reading a consistent copy
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        write_fn(f)
+    os.replace(tmp_path, path)
+
+
+def quantize_rows(embeddings: np.ndarray, dtype: str):
+    if dtype == "int8":
+        scales = np.abs(embeddings).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.rint(embeddings / scales[:, None]).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    if dtype == "float16":
+        quantized = embeddings.astype(np.float16)
+        return quantized, np.ones(embeddings.shape[0], dtype=np.float32)
+    if dtype == "float32":
+        quantized = embeddings.astype(np.float32)
+        return quantized, np.ones(embeddings.shape[0], dtype=np.float32)
+    raise ValueError(f"Unsupported quantization dtype {dtype}")
+
+
+def prefix_rows(embeddings: np.ndarray, scan_dims: int | None):
+    if scan_dims is None:
         return embeddings
+    # a renormalised prefix of a Matryoshka embedding is itself a usable embedding
+    prefix = embeddings[:, :scan_dims]
+    norms = np.linalg.norm(prefix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return prefix / norms
+
+
+def lexical_tokens(item, text: str) -> list[str]:
+    name = item if isinstance(item, str) else item.get("name", "")
+    return tokenize(name if name == text else f"{name} {text}")
+
+
+class RowBuffer:
+    """Capacity-doubling row storage whose first `size` rows are the logical array."""
+
+    min_capacity = 16
+
+    def __init__(self, array: np.ndarray):
+        self.data = array
+        self.size = len(array)
+
+    @property
+    def view(self) -> np.ndarray:
+        return self.data[: self.size]
+
+    def append(self, rows: np.ndarray):
+        needed = self.size + len(rows)
+        # memory-mapped or otherwise read-only arrays are copied on first append
+        if needed > len(self.data) or not self.data.flags.writeable:
+            capacity = max(needed, 2 * len(self.data), self.min_capacity)
+            data = np.empty((capacity,) + self.data.shape[1:], dtype=self.data.dtype)
+            data[: self.size] = self.data[: self.size]
+            self.data = data
+        self.data[self.size : needed] = rows
+        self.size = needed
+
+
+class LazyItems(Sequence):
+    """Read-only sequence of JSON items decoded by row from a memory-mapped file."""
+
+    def __init__(self, items_path: str, offsets: np.ndarray):
+        self.offsets = offsets
+        with open(items_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                self._data = b""
+            else:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return json.loads(self._data[start:end])
 
 
 class Collection:
     embed_size = 3072
+    rerank_k = 256
+    scan_block_rows = 16384
+    nprobe = 8
+    # items are identified by this key (string items by themselves)
+    id_key = "name"
+    # tombstoned fraction of rows above which the matrices are compacted
+    compact_ratio = 0.2
 
-    def __init__(self, file_path: str | None = None):
+    def __init__(
+        self,
+        file_path: str | None = None,
+        embed_size: int | None = None,
+        scan_dims: int | None = None,
+        cache: EmbeddingCache | None = None,
+        backend: str | None = None,
+        name: str | None = None,
+    ):
         self.items = []
-        self.embedder = OpenAIEmbedder()
+        self.cache = cache
+        # results of _search, dropped whenever rows or indexes change
+        self.query_cache = QueryCache.from_settings()
+        self._writes = 0
+        if name is None and file_path:
+            name = os.path.splitext(os.path.basename(file_path.rstrip("/")))[0]
+        self.name = name
+        # an explicit backend must match the one recorded in a loaded collection
+        self._requested_backend = backend
+        self.backend = (
+            self._recorded_backend(file_path) or backend or default_backend(name)
+        )
+        self.embed_size = embed_size
+        self.embedder = self._make_embedder()
+        self.embed_size = self.embedder.embed_size
         self.embeddings = np.empty(
-            (0, Collection.embed_size),
+            (0, self.embed_size),
             dtype=np.float32,
         )
+        # optional coarse-scan matrix (embedding prefix and/or quantized copy)
+        # searched first, before the exact rerank on the full embeddings
+        self.scan_dims = scan_dims
+        self.coarse_dtype: str | None = None
+        self.coarse = None
+        self.coarse_scales = None
+        if scan_dims is not None:
+            self._build_coarse("float32")
+        # optional inverted-file index, (re)built on save when ivf_lists is set
+        self.ivf_lists: int | None = None
+        self.ivf: IVFIndex | None = None
+        # BM25 over item names and texts; None for collections stored without
+        # one (see build_lexical). New documents are merged in on first use.
+        self._lexical: BM25Index | None = BM25Index.empty()
+        self._lexical_pending: list[list[str]] = []
+        # per-key metadata row indexes for filtered search, built on first use
+        self._attributes: AttributeIndex | None = None
+        # tombstones of deleted/replaced rows and the live row of each item id,
+        # both created on first use
+        self._deleted: RowBuffer | None = None
+        self._rows_by_id: dict | None = None
         if file_path:
             self.load(file_path)
 
+    # matrices are kept in growable buffers so that appends are amortised O(1)
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self._embeddings.view
+
+    @embeddings.setter
+    def embeddings(self, value: np.ndarray):
+        self._embeddings = RowBuffer(value)
+
+    @property
+    def coarse(self) -> np.ndarray | None:
+        return None if self._coarse is None else self._coarse.view
+
+    @coarse.setter
+    def coarse(self, value: np.ndarray | None):
+        self._coarse = None if value is None else RowBuffer(value)
+
+    @property
+    def coarse_scales(self) -> np.ndarray | None:
+        return None if self._coarse_scales is None else self._coarse_scales.view
+
+    @coarse_scales.setter
+    def coarse_scales(self, value: np.ndarray | None):
+        self._coarse_scales = None if value is None else RowBuffer(value)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of the matrices and indexes, memory-mapped ones included."""
+        arrays = [self.embeddings, self.coarse, self.coarse_scales]
+        if self.ivf is not None:
+            arrays += [self.ivf.centroids, self.ivf.offsets, self.ivf.rows]
+        if self._lexical is not None:
+            arrays += list(self._lexical.arrays().values())
+        if isinstance(self.items, LazyItems):
+            arrays.append(self.items.offsets)
+            total = len(self.items._data)
+        else:
+            total = 0
+        return total + sum(a.nbytes for a in arrays if a is not None)
+
     def load(self, file_path: str):
+        if os.path.isdir(file_path):
+            return self._load_dir(file_path)
         data = np.load(file_path, allow_pickle=True)
         self.items = data["items"]
         self.embeddings = data["embeddings"]
+        self._set_embedder(self.backend, self.embeddings.shape[1])
+        self._lexical, self._lexical_pending = None, []
+        self._attributes = None
+        self._deleted, self._rows_by_id = None, None
+        self._writes += 1
+        if self.coarse_dtype is not None:
+            self._build_coarse(self.coarse_dtype)
 
     def save(self, file_path: str):
+        # tombstones are not persisted; the segment is rewritten without them
+        self.compact()
+        if not file_path.endswith(".npz"):
+            return self._save_dir(file_path)
         np.savez_compressed(
             file=file_path,
             allow_pickle=True,
@@ -56,13 +376,334 @@ class Collection:
             embeddings=self.embeddings,
         )
 
+    def _load_dir(self, dir_path: str):
+        with open(os.path.join(dir_path, META_FILE), "r") as f:
+            meta = json.load(f)
+        if meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported collection format version {meta['format_version']}"
+            )
+        embeddings = np.load(os.path.join(dir_path, EMBEDDINGS_FILE), mmap_mode="r")
+        offsets = np.load(os.path.join(dir_path, ITEM_OFFSETS_FILE), mmap_mode="r")
+        assert embeddings.shape == (meta["count"], meta["embed_size"])
+        assert len(offsets) == meta["count"] + 1
+        self.items = LazyItems(os.path.join(dir_path, ITEMS_FILE), offsets)
+        self.embeddings = embeddings
+        self._set_embedder(meta.get("backend", "openai"), meta["embed_size"])
+        if meta.get("model", self.embedder.model) != self.embedder.model:
+            raise ValueError(
+                f"Collection was built with {meta['model']}, "
+                f"backend {self.backend} embeds with {self.embedder.model}"
+            )
+        self.scan_dims = meta.get("scan_dims")
+        self.coarse_dtype = meta.get("coarse_dtype")
+        self.coarse, self.coarse_scales = None, None
+        if self.coarse_dtype is not None:
+            # memory-mapped like the embeddings so that all processes on a host
+            # share one page-cache copy; float32 rows are paged in on rerank
+            self.coarse = np.load(os.path.join(dir_path, COARSE_FILE), mmap_mode="r")
+            self.coarse_scales = np.load(
+                os.path.join(dir_path, COARSE_SCALES_FILE), mmap_mode="r"
+            )
+            assert len(self.coarse) == len(embeddings)
+        self.ivf_lists = meta.get("ivf_lists")
+        self.ivf = None
+        if self.ivf_lists is not None:
+            self.ivf = IVFIndex(
+                centroids=np.load(os.path.join(dir_path, IVF_CENTROIDS_FILE)),
+                offsets=np.load(os.path.join(dir_path, IVF_OFFSETS_FILE)),
+                rows=np.load(os.path.join(dir_path, IVF_ROWS_FILE), mmap_mode="r"),
+            )
+        self._lexical, self._lexical_pending = None, []
+        self._attributes = None
+        self._deleted, self._rows_by_id = None, None
+        self._writes += 1
+        if meta.get("lexical"):
+            self._lexical = BM25Index.load(dir_path)
+            assert len(self._lexical) == meta["count"]
+
+    def _save_dir(self, dir_path: str):
+        os.makedirs(dir_path, exist_ok=True)
+        offsets = np.zeros(len(self.items) + 1, dtype=np.int64)
+
+        def write_items(f):
+            for i, item in enumerate(self.items):
+                line = json.dumps(item, ensure_ascii=False).encode("utf-8") + b"\n"
+                f.write(line)
+                offsets[i + 1] = offsets[i] + len(line)
+
+        embeddings = np.ascontiguousarray(self.embeddings, dtype=np.float32)
+        _replace_file(os.path.join(dir_path, ITEMS_FILE), write_items)
+        _replace_file(
+            os.path.join(dir_path, ITEM_OFFSETS_FILE), lambda f: np.save(f, offsets)
+        )
+        _replace_file(
+            os.path.join(dir_path, EMBEDDINGS_FILE), lambda f: np.save(f, embeddings)
+        )
+        if self.ivf_lists is not None and self.ivf is None:
+            self.build_ivf(self.ivf_lists)
+        if self.ivf is not None:
+            for name, array in [
+                (IVF_CENTROIDS_FILE, self.ivf.centroids),
+                (IVF_OFFSETS_FILE, self.ivf.offsets),
+                (IVF_ROWS_FILE, self.ivf.rows),
+            ]:
+                _replace_file(
+                    os.path.join(dir_path, name),
+                    lambda f, array=array: np.save(f, array),
+                )
+        lexical = self.lexical
+        if lexical is not None:
+            for name, array in lexical.arrays().items():
+                _replace_file(
+                    os.path.join(dir_path, name),
+                    lambda f, array=array: np.save(f, array),
+                )
+            _replace_file(
+                os.path.join(dir_path, lexical_index.VOCAB_FILE),
+                lambda f: f.write(
+                    json.dumps(lexical.vocab_terms(), ensure_ascii=False).encode()
+                ),
+            )
+        if self.coarse is not None:
+            _replace_file(
+                os.path.join(dir_path, COARSE_FILE),
+                lambda f: np.save(f, self.coarse),
+            )
+            _replace_file(
+                os.path.join(dir_path, COARSE_SCALES_FILE),
+                lambda f: np.save(f, self.coarse_scales),
+            )
+        meta = {
+            "format_version": FORMAT_VERSION,
+            "count": len(self.items),
+            "embed_size": int(embeddings.shape[1]),
+            "backend": self.backend,
+            "model": self.embedder.model,
+            "scan_dims": self.scan_dims,
+            "coarse_dtype": self.coarse_dtype,
+            "ivf_lists": None if self.ivf is None else self.ivf.n_lists,
+            "lexical": lexical is not None,
+        }
+        _replace_file(
+            os.path.join(dir_path, META_FILE),
+            lambda f: f.write(json.dumps(meta, indent=2).encode("utf-8")),
+        )
+
+    @staticmethod
+    def _recorded_backend(file_path: str | None) -> str | None:
+        if not file_path or not os.path.isdir(file_path):
+            return None
+        with open(os.path.join(file_path, META_FILE), "r") as f:
+            return json.load(f).get("backend", "openai")
+
+    def _make_embedder(self):
+        dimensions = None
+        if self.backend == "openai" and self.embed_size not in (
+            None,
+            OpenAIEmbedder.embed_size,
+        ):
+            dimensions = self.embed_size
+        return make_embedder(self.backend, dimensions, self.cache)
+
+    def _set_embedder(self, backend: str, embed_size: int):
+        if self._requested_backend not in (None, backend):
+            raise ValueError(
+                f"Collection {self.name} was built with the {backend} backend, "
+                f"not {self._requested_backend}"
+            )
+        if backend != self.backend or embed_size != self.embed_size:
+            self.backend = backend
+            self.embed_size = embed_size
+            self.embedder = self._make_embedder()
+        assert self.embedder.embed_size == embed_size
+
+    def quantize(self, dtype: str = "int8"):
+        self._build_coarse(dtype)
+
+    def _build_coarse(self, dtype: str):
+        self.coarse_dtype = dtype
+        self.coarse, self.coarse_scales = quantize_rows(
+            prefix_rows(np.asarray(self.embeddings, dtype=np.float32), self.scan_dims),
+            dtype,
+        )
+        self._writes += 1
+
+    def build_ivf(self, n_lists: int | None = None, iters: int = 20):
+        self.ivf = IVFIndex.build(self.embeddings, n_lists, iters=iters)
+        self.ivf_lists = self.ivf.n_lists
+        self._writes += 1
+
+    def ivf_recall_report(
+        self,
+        query_matrix: np.ndarray,
+        top_k: int = 10,
+        nprobes: Iterable[int] = (1, 2, 4, 8, 16, 32),
+    ) -> list[dict]:
+        """Recall@k and latency of IVF search against exact search, per nprobe."""
+        assert self.ivf is not None
+        start = time.perf_counter()
+        exact = [
+            self._select(self.embeddings.dot(q), top_k, None) for q in query_matrix
+        ]
+        exact_ms = (time.perf_counter() - start) * 1000 / len(query_matrix)
+        nprobe = self.nprobe
+        try:
+            report = []
+            for self.nprobe in nprobes:
+                start = time.perf_counter()
+                approx = [self._search_rows(q, top_k)[0] for q in query_matrix]
+                latency_ms = (time.perf_counter() - start) * 1000 / len(query_matrix)
+                recall = np.mean(
+                    [
+                        len(np.intersect1d(a, e)) / max(1, len(e))
+                        for a, e in zip(approx, exact)
+                    ]
+                )
+                report.append(
+                    {
+                        "nprobe": self.nprobe,
+                        "recall": float(recall),
+                        "latency_ms": latency_ms,
+                        "exact_latency_ms": exact_ms,
+                    }
+                )
+            return report
+        finally:
+            self.nprobe = nprobe
+
+    @property
+    def lexical(self) -> BM25Index | None:
+        if self._lexical is not None and self._lexical_pending:
+            self._lexical = self._lexical.extended(self._lexical_pending)
+            self._lexical_pending = []
+        return self._lexical
+
+    def build_lexical(self, texts: list[str]):
+        assert len(texts) == len(self.items)
+        self._lexical = BM25Index.build(
+            [lexical_tokens(item, text) for item, text in zip(self.items, texts)]
+        )
+        self._lexical_pending = []
+
+    @property
+    def attributes(self) -> AttributeIndex:
+        if self._attributes is None:
+            self._attributes = AttributeIndex(self.items)
+        return self._attributes
+
+    def index_attributes(self, *keys: str):
+        """Precompute filter row indexes for the given metadata keys."""
+        self.attributes.index_keys(*keys)
+
+    def _row_mask(self, where: dict | None) -> np.ndarray | None:
+        """Rows matching where and not tombstoned; None when all rows qualify."""
+        deleted = self.deleted
+        if deleted is not None and not deleted.any():
+            deleted = None
+        if where is None:
+            return None if deleted is None else ~deleted
+        mask = self.attributes.evaluate(where)
+        return mask if deleted is None else mask & ~deleted
+
+    def _allowed_rows(self, where: dict | None) -> np.ndarray | None:
+        mask = self._row_mask(where)
+        return None if mask is None else np.flatnonzero(mask)
+
     def add_items(self, items: list, texts: list[str]):
         embeddings = self.embedder(texts)
-        return self._add(items, embeddings)
+        return self._add(items, embeddings, texts)
+
+    def item_id(self, item) -> str:
+        return item if isinstance(item, str) else item[self.id_key]
+
+    @property
+    def deleted(self) -> np.ndarray | None:
+        return None if self._deleted is None else self._deleted.view
+
+    def _row_ids(self) -> dict:
+        if self._rows_by_id is None:
+            deleted = self.deleted
+            self._rows_by_id = {
+                self.item_id(item): row
+                for row, item in enumerate(self.items)
+                if deleted is None or not deleted[row]
+            }
+        return self._rows_by_id
+
+    def _tombstone(self, rows: list[int]):
+        if self._deleted is None:
+            self._deleted = RowBuffer(np.zeros(len(self.items), dtype=bool))
+        self._deleted.data[rows] = True
+        self._writes += 1
+
+    def upsert(self, items: list, texts: list[str]):
+        """
+        Add items, replacing live items with the same id. Only the given texts
+        are embedded; replaced rows are tombstoned and the new rows appended.
+        """
+        # the last occurrence of an id repeated within the batch wins
+        last = {self.item_id(item): i for i, item in enumerate(items)}
+        if len(last) < len(items):
+            keep = sorted(last.values())
+            items, texts = [items[i] for i in keep], [texts[i] for i in keep]
+        row_ids = self._row_ids()
+        replaced = [row_ids[i] for i in map(self.item_id, items) if i in row_ids]
+        rows = self.add_items(items, texts)
+        if replaced:
+            self._tombstone(replaced)
+            self._maybe_compact()
+        return rows
 
-    def _add(self, items: list, embeddings: np.ndarray):
+    def delete(self, ids: Iterable[str]) -> int:
+        """Tombstone the live items with the given ids; returns how many."""
+        row_ids = self._row_ids()
+        rows = [row_ids.pop(i) for i in ids if i in row_ids]
+        if rows:
+            self._tombstone(rows)
+            self._maybe_compact()
+        return len(rows)
+
+    def _maybe_compact(self):
+        deleted = self.deleted
+        if deleted is not None and deleted.mean() > self.compact_ratio:
+            self.compact()
+
+    def compact(self):
+        """Drop tombstoned rows from the items, matrices and indexes."""
+        deleted = self.deleted
+        if deleted is None or not deleted.any():
+            return
+        keep = ~deleted
+        rows = np.flatnonzero(keep)
+        lexical = self.lexical
+        self.items = [self.items[i] for i in rows]
+        self.embeddings = np.ascontiguousarray(self.embeddings[rows])
+        if self.coarse is not None:
+            self.coarse = np.ascontiguousarray(self.coarse[rows])
+            self.coarse_scales = np.ascontiguousarray(self.coarse_scales[rows])
+        if self.ivf is not None:
+            self.ivf = self.ivf.compacted(keep)
+        if lexical is not None:
+            self._lexical = lexical.compacted(keep)
+        self._attributes = None
+        self._deleted, self._rows_by_id = None, None
+        self._writes += 1
+
+    def add_items_streaming(self, pairs: Iterable[tuple], chunk_size: int = 256):
+        """Embed and append (item, text) pairs chunk by chunk."""
+        start = len(self.items)
+        pairs = iter(pairs)
+        while chunk := list(islice(pairs, chunk_size)):
+            items, texts = zip(*chunk)
+            self.add_items(list(items), list(texts))
+        return np.arange(start, len(self.items))
+
+    def _add(
+        self, items: list, embeddings: np.ndarray, texts: list[str] | None = None
+    ):
         assert embeddings.ndim == 2
-        assert embeddings.shape[1] == Collection.embed_size
+        assert embeddings.shape[1] == self.embed_size
         assert len(items) == embeddings.shape[0]
 
         # normalize embeddings
@@ -70,25 +711,211 @@ class Collection:
         embeddings = embeddings / norms
 
         start, end = len(self.items), len(self.items) + len(items)
+        if not isinstance(self.items, list):
+            self.items = list(self.items)
         self.items.extend(items)
-        self.embeddings = np.vstack((self.embeddings, embeddings))
+        self._embeddings.append(embeddings)
+        if self._coarse is not None and self.coarse_dtype is not None:
+            coarse, scales = quantize_rows(
+                prefix_rows(embeddings, self.scan_dims), self.coarse_dtype
+            )
+            self._coarse.append(coarse)
+            self._coarse_scales.append(scales)
+        # new rows go to their nearest existing lists
+        if self.ivf is not None:
+            self.ivf = self.ivf.extended(embeddings, start)
+        self._attributes = None
+        self._writes += 1
+        if self._deleted is not None:
+            self._deleted.append(np.zeros(len(items), dtype=bool))
+        if self._rows_by_id is not None:
+            for row, item in enumerate(items, start=start):
+                self._rows_by_id[self.item_id(item)] = row
+        if self._lexical is not None:
+            self._lexical_pending.extend(
+                lexical_tokens(item, text)
+                for item, text in zip(items, texts or [""] * len(items))
+            )
         return np.arange(start, end)
 
-    def search_items(self, query_text: str, top_k: int | None = None):
+    def search_items(
+        self, query_text: str, top_k: int | None = None, where: dict | None = None
+    ):
         query_embedding = self.embedder(query_text)
-        return self._search(query_embedding, top_k)
+        return self._search(query_embedding, top_k, where=where)
+
+    def search_lexical(
+        self, query_text: str, top_k: int | None = 10, where: dict | None = None
+    ):
+        lexical = self.lexical
+        assert lexical is not None, "collection has no lexical index"
+        scores = lexical.scores(query_text)
+        mask = self._row_mask(where)
+        if mask is not None:
+            scores[~mask] = 0.0
+        rows = self._select(scores, top_k, None)
+        rows = rows[scores[rows] > 0]
+        return [self.items[i] for i in rows], scores[rows]
 
-    def _search(self, query_embedding: np.ndarray, top_k: int | None = None):
+    def search_hybrid(
+        self,
+        query_text: str,
+        top_k: int = 10,
+        query_embedding: np.ndarray | None = None,
+        candidates: int = 100,
+        rrf_k: int = 60,
+        where: dict | None = None,
+    ):
+        """Reciprocal rank fusion of BM25 and cosine rankings."""
+        lexical = self.lexical
+        assert lexical is not None, "collection has no lexical index"
+        if query_embedding is None:
+            query_embedding = self.embedder(query_text)
+        allowed = None
+        lexical_scores = lexical.scores(query_text)
+        mask = self._row_mask(where)
+        if mask is not None:
+            lexical_scores[~mask] = 0.0
+            allowed = np.flatnonzero(mask)
+        lexical_rows = self._select(lexical_scores, candidates, None)
+        lexical_rows = lexical_rows[lexical_scores[lexical_rows] > 0]
+        vector_rows, _ = self._search_rows(
+            query_embedding, candidates, allowed_rows=allowed
+        )
+        rows, scores = reciprocal_rank_fusion([vector_rows, lexical_rows], rrf_k)
+        rows, scores = rows[:top_k], scores[:top_k]
+        return [self.items[i] for i in rows], scores
+
+    def _search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int | None = None,
+        min_score: float | None = None,
+        where: dict | None = None,
+    ):
         assert query_embedding.ndim == 1
-        assert query_embedding.shape[0] == Collection.embed_size
-
-        if top_k is None:
-            top_k = len(self.items)
-
-        # cosine similarity
-        dists = self.embeddings.dot(query_embedding)
-        indices = np.argsort(dists)[::-1]
-        top_k_indices = indices[:top_k]
-        # result = [(dists[i], self.items[i]) for i in top_k_indices]
-        result = [self.items[i] for i in top_k_indices], dists[top_k_indices]
-        return result
+        self.query_cache.validate(self._writes)
+        # nprobe and rerank_k are tuned on live collections and change results
+        key = query_key(
+            query_embedding, top_k, min_score, where, self.nprobe, self.rerank_k
+        )
+        result = self.query_cache.get(key)
+        if result is None:
+            result = self.search_many(
+                query_embedding[None, :], top_k, min_score, where
+            )[0]
+            # whole-collection rankings (top_k=None) count against max_bytes
+            self.query_cache.put(key, result, result[1].nbytes + 8 * len(result[0]))
+        items, scores = result
+        return list(items), scores.copy()
+
+    def search_many(
+        self,
+        query_matrix: np.ndarray,
+        top_k: int | None = None,
+        min_score: float | None = None,
+        where: dict | None = None,
+    ):
+        """
+        where is a Chroma-style metadata filter (see AttributeIndex); it is
+        evaluated on the precomputed row indexes and only matching rows are scored.
+        """
+        assert query_matrix.ndim == 2
+        assert query_matrix.shape[1] == self.embed_size
+        allowed = self._allowed_rows(where)
+
+        if top_k is None or (self.coarse is None and self.ivf is None):
+            embeddings = self.embeddings
+            if allowed is not None:
+                embeddings = embeddings[allowed]
+            # one matrix multiply for the whole block of queries
+            scores = query_matrix.dot(embeddings.T)
+            results = []
+            for dists in scores:
+                top_k_indices = self._select(dists, top_k, min_score)
+                rows = top_k_indices if allowed is None else allowed[top_k_indices]
+                results.append(([self.items[i] for i in rows], dists[top_k_indices]))
+            return results
+
+        coarse_scores = None
+        if self.coarse is not None and self.ivf is None:
+            coarse_scores = self._coarse_scores(query_matrix, allowed)
+        results = []
+        for i, query_embedding in enumerate(query_matrix):
+            rows, dists = self._search_rows(
+                query_embedding,
+                top_k,
+                min_score,
+                None if coarse_scores is None else coarse_scores[i],
+                allowed,
+            )
+            results.append(([self.items[r] for r in rows], dists))
+        return results
+
+    def _search_rows(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int,
+        min_score: float | None = None,
+        coarse_scores: np.ndarray | None = None,
+        allowed_rows: np.ndarray | None = None,
+    ):
+        # candidate rows from the IVF posting lists, then a coarse scan over
+        # the prefix/quantized matrix, then an exact float32 rerank.
+        # allowed_rows (sorted) restricts every stage to filtered rows;
+        # coarse_scores, when given, are aligned with allowed_rows.
+        rows = allowed_rows
+        if self.ivf is not None:
+            probed = self.ivf.probe(query_embedding, self.nprobe)
+            if allowed_rows is None:
+                rows = probed
+            else:
+                rows = probed[np.isin(probed, allowed_rows, assume_unique=True)]
+                coarse_scores = None
+        if self.coarse is not None:
+            if coarse_scores is None:
+                coarse_scores = self._coarse_scores(query_embedding[None, :], rows)[0]
+            candidates = self._select(coarse_scores, max(top_k, self.rerank_k), None)
+            rows = np.sort(candidates if rows is None else rows[candidates])
+        if rows is None:
+            # scored in place; indexing with all rows would copy the matrix
+            dists = self.embeddings.dot(query_embedding)
+            selected = self._select(dists, top_k, min_score)
+            return selected, dists[selected]
+        dists = self.embeddings[rows].dot(query_embedding)
+        selected = self._select(dists, top_k, min_score)
+        return rows[selected], dists[selected]
+
+    def _coarse_scores(self, query_matrix: np.ndarray, rows: np.ndarray | None = None):
+        assert self.coarse is not None and self.coarse_scales is not None
+        query_matrix = prefix_rows(query_matrix, self.scan_dims)
+        if rows is not None:
+            block = self.coarse[rows].astype(np.float32, copy=False)
+            return query_matrix.dot(block.T) * self.coarse_scales[rows]
+        scores = np.empty((query_matrix.shape[0], len(self.coarse)), np.float32)
+        # dequantize in blocks to bound the temporary float32 copy
+        for start in range(0, len(self.coarse), self.scan_block_rows):
+            end = start + self.scan_block_rows
+            block = self.coarse[start:end].astype(np.float32, copy=False)
+            scores[:, start:end] = (
+                query_matrix.dot(block.T) * self.coarse_scales[start:end]
+            )
+        return scores
+
+    @staticmethod
+    def _select(dists: np.ndarray, top_k: int | None, min_score: float | None):
+        n = dists.shape[0]
+        if top_k is None or top_k > n:
+            top_k = n
+        if top_k <= 0:
+            return np.empty(0, dtype=np.intp)
+
+        # partial selection, then sort only the selected slice
+        if top_k < n:
+            indices = np.argpartition(dists, n - top_k)[n - top_k :]
+        else:
+            indices = np.arange(n)
+        indices = indices[np.argsort(dists[indices])[::-1]]
+        if min_score is not None:
+            indices = indices[dists[indices] >= min_score]
+        return indices
@@ -0,0 +1,208 @@
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+from flat_catalog import Collection
+from query_cache import QueryCache, query_key
+
+GROUP_INDEX_FILE = "group_index.npz"
+
+
+def _csr(lists: list[list[int]]):
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(rows) for rows in lists], out=offsets[1:])
+    rows = np.fromiter((r for rows in lists for r in rows), dtype=np.int64)
+    return offsets, rows
+
+
+def _rank_segments(offsets: np.ndarray, rows: np.ndarray, scores: np.ndarray):
+    """Sort every CSR segment by descending score in one lexsort."""
+    segment = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    row_scores = scores[rows]
+    order = np.lexsort((-row_scores, segment))
+    return rows[order], row_scores[order]
+
+
+class GroupIndex:
+    """Row indexes from each group to its products and colours (CSR arrays)."""
+
+    def __init__(
+        self,
+        product_offsets: np.ndarray,
+        product_rows: np.ndarray,
+        color_offsets: np.ndarray,
+        color_rows: np.ndarray,
+    ):
+        self.product_offsets = product_offsets
+        self.product_rows = product_rows
+        self.color_offsets = color_offsets
+        self.color_rows = color_rows
+
+    @classmethod
+    def build(cls, groups: Collection, products: Collection, colors: Collection):
+        # live rows only, so that deleted products and colours are left out
+        product_row = products._row_ids()
+        color_row = colors._row_ids()
+        product_lists, color_lists = [], []
+        for g in groups.items:
+            product_lists.append(
+                [product_row[p] for p in g["products"] if p in product_row]
+            )
+            color_lists.append([color_row[c] for c in g["colors"] if c in color_row])
+        return cls(*_csr(product_lists), *_csr(color_lists))
+
+    @classmethod
+    def load(cls, file_path: str):
+        data = np.load(file_path, allow_pickle=False)
+        return cls(
+            data["product_offsets"],
+            data["product_rows"],
+            data["color_offsets"],
+            data["color_rows"],
+        )
+
+    def save(self, file_path: str):
+        np.savez(
+            file_path,
+            product_offsets=self.product_offsets,
+            product_rows=self.product_rows,
+            color_offsets=self.color_offsets,
+            color_rows=self.color_rows,
+        )
+
+
+@dataclass
+class GroupHit:
+    row: int
+    score: float
+    product_rows: np.ndarray
+    product_scores: np.ndarray
+    color_rows: np.ndarray
+    color_scores: np.ndarray
+
+
+class GroupSearch:
+    """Joint group/product/colour retrieval over the flat catalog collections."""
+
+    def __init__(
+        self,
+        groups: Collection,
+        products: Collection,
+        colors: Collection,
+        index: GroupIndex,
+    ):
+        # one query embedding is scored against all three collections
+        collections = {"groups": groups, "products": products, "colors": colors}
+        embedders = {
+            name: (c.backend, c.embedder.model, c.embed_size)
+            for name, c in collections.items()
+        }
+        if len(set(embedders.values())) > 1:
+            raise ValueError(
+                "Group search collections must share one embedding "
+                f"(backend, model, size), got {embedders}"
+            )
+        self.groups = groups
+        self.products = products
+        self.colors = colors
+        self.index = index
+        self._versions = self._collection_versions()
+        # results of search, dropped whenever one of the collections changes
+        self.query_cache = QueryCache.from_settings()
+
+    def _collection_versions(self) -> tuple:
+        return (self.groups._writes, self.products._writes, self.colors._writes)
+
+    def _current_index(self) -> GroupIndex:
+        # rows are renumbered by compaction and replaced by upserts, so the
+        # index is rebuilt after any of the collections has changed
+        versions = self._collection_versions()
+        if versions != self._versions:
+            self.index = GroupIndex.build(self.groups, self.products, self.colors)
+            self._versions = versions
+        return self.index
+
+    @property
+    def nbytes(self) -> int:
+        idx = self.index
+        return (
+            self.groups.nbytes
+            + self.products.nbytes
+            + self.colors.nbytes
+            + idx.product_offsets.nbytes
+            + idx.product_rows.nbytes
+            + idx.color_offsets.nbytes
+            + idx.color_rows.nbytes
+        )
+
+    @classmethod
+    def load(cls, dir_path: str, cache: EmbeddingCache | None = None):
+        # catalogs not yet converted (flat_preprocess.py --convert) only have
+        # the .npz collections and no saved index, which is then built here
+        paths = {}
+        for name in ["groups", "products", "colors"]:
+            path = os.path.join(dir_path, name)
+            paths[name] = path if os.path.isdir(path) else f"{path}.npz"
+        collections = {
+            name: Collection(path, cache=cache) for name, path in paths.items()
+        }
+        index_path = os.path.join(dir_path, GROUP_INDEX_FILE)
+        if os.path.isfile(index_path) and all(map(os.path.isdir, paths.values())):
+            index = GroupIndex.load(index_path)
+        else:
+            index = GroupIndex.build(**collections)
+        return cls(**collections, index=index)
+
+    def search(self, query_embedding: np.ndarray, top_k: int | None = None):
+        """Ranked groups, each with its own products and colours ranked by score."""
+        self.query_cache.validate(self._collection_versions())
+        key = query_key(query_embedding, top_k)
+        hits = self.query_cache.get(key)
+        if hits is None:
+            hits = self._search(query_embedding, top_k)
+            nbytes = sum(
+                h.product_rows.nbytes
+                + h.product_scores.nbytes
+                + h.color_rows.nbytes
+                + h.color_scores.nbytes
+                for h in hits
+            )
+            self.query_cache.put(key, hits, nbytes)
+        return list(hits)
+
+    def _search(self, query_embedding: np.ndarray, top_k: int | None):
+        idx = self._current_index()
+        group_scores = self.groups.embeddings.dot(query_embedding)
+        deleted = self.groups.deleted
+        if deleted is not None:
+            group_scores[deleted] = -np.inf
+        group_rows = Collection._select(group_scores, top_k, None)
+        if deleted is not None:
+            group_rows = group_rows[~deleted[group_rows]]
+        product_scores = self.products.embeddings.dot(query_embedding)
+        color_scores = self.colors.embeddings.dot(query_embedding)
+
+        product_rows, ranked_product_scores = _rank_segments(
+            idx.product_offsets, idx.product_rows, product_scores
+        )
+        color_rows, ranked_color_scores = _rank_segments(
+            idx.color_offsets, idx.color_rows, color_scores
+        )
+        hits = []
+        for g in group_rows:
+            p = slice(idx.product_offsets[g], idx.product_offsets[g + 1])
+            c = slice(idx.color_offsets[g], idx.color_offsets[g + 1])
+            hits.append(
+                GroupHit(
+                    row=int(g),
+                    score=float(group_scores[g]),
+                    # copies, so that cached hits do not pin the full arrays
+                    product_rows=product_rows[p].copy(),
+                    product_scores=ranked_product_scores[p].copy(),
+                    color_rows=color_rows[c].copy(),
+                    color_scores=ranked_color_scores[c].copy(),
+                )
+            )
+        return hits
@@ -0,0 +1,44 @@
+import argparse
+import json
+
+import numpy as np
+
+from embedding_cache import DEFAULT_CACHE_PATH, EmbeddingCache
+from flat_catalog import Collection
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recall@k and latency of IVF search against exact search"
+    )
+    parser.add_argument("collection", help="Path to a collection directory")
+    parser.add_argument(
+        "--queries",
+        default=None,
+        help="Text file with one query per line (default: sample of item vectors)",
+    )
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--sample", type=int, default=200)
+    args = parser.parse_args()
+
+    collection = Collection(args.collection, cache=EmbeddingCache(DEFAULT_CACHE_PATH))
+    if collection.ivf is None:
+        collection.build_ivf()
+
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        query_matrix = collection.embedder(texts)
+    else:
+        rng = np.random.default_rng(0)
+        n = min(args.sample, len(collection.embeddings))
+        rows = np.sort(rng.choice(len(collection.embeddings), n, replace=False))
+        query_matrix = np.asarray(collection.embeddings[rows])
+
+    report = collection.ivf_recall_report(query_matrix, args.top_k, args.nprobe)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
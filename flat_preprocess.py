@@ -1,8 +1,11 @@
 import argparse
 import json
+import os
 from dataclasses import dataclass
 
+from embedding_cache import DEFAULT_CACHE_PATH, EmbeddingCache
 from flat_catalog import Collection
+from flat_group_search import GROUP_INDEX_FILE, GroupIndex
 
 
 @dataclass
@@ -11,28 +14,119 @@ class Product:
     products: list[str]
     colors: list[str]
     description: str
+    product_types: list[str]
+
+
+def group_product_types(product_data: dict) -> dict[str, list[str]]:
+    types: dict[str, list[str]] = {}
+    for type_dict in product_data["product_types_db"].values():
+        for group_name in type_dict["AH PRODUCT GROUPS"]:
+            types.setdefault(group_name, []).append(type_dict["AH PRODUCT TYPE NAME"])
+    return types
+
+
+def save_collection(collection: Collection, path: str, args: argparse.Namespace):
+    if args.quantize:
+        collection.quantize(args.quantize)
+    if args.ivf_lists:
+        collection.ivf_lists = args.ivf_lists
+    collection.save(path)
+
+
+def save_group_index():
+    """Group -> product/colour row indexes over the saved collections."""
+    collection_dirs = [
+        os.path.join("catalog_db2", name) for name in ["groups", "products", "colors"]
+    ]
+    if all(os.path.isdir(d) for d in collection_dirs):
+        index = GroupIndex.build(*[Collection(d) for d in collection_dirs])
+        index.save(os.path.join("catalog_db2", GROUP_INDEX_FILE))
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "product_data",
+        nargs="?",
         help="Path to product JSON file (alternative_hierarchy_db.json)",
     )
     parser.add_argument(
         "index_data",
+        nargs="?",
         help="Path to index JSON file (all_products.json)",
     )
     parser.add_argument("--groups", action="store_true", help="Process product groups")
     parser.add_argument("--products", action="store_true", help="Process products")
     parser.add_argument("--colors", action="store_true", help="Process colors")
+    parser.add_argument(
+        "--convert",
+        action="store_true",
+        help="Convert existing catalog_db2/*.npz collections to the directory format",
+    )
+    parser.add_argument(
+        "--quantize",
+        choices=["int8", "float16"],
+        default=None,
+        help="Store a quantized copy of the embeddings for the coarse scan",
+    )
+    parser.add_argument(
+        "--embed-size",
+        type=int,
+        default=None,
+        help="Embedding dimensions requested from the API and stored for rerank",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["openai", "local"],
+        default=None,
+        help="Embedding backend (default: from settings, per collection name)",
+    )
+    parser.add_argument(
+        "--scan-dims",
+        type=int,
+        default=None,
+        help="Embedding prefix length used for the first-pass scan (e.g. 256, 512)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=256,
+        help="Number of texts embedded and appended per request",
+    )
+    parser.add_argument(
+        "--embedding-cache",
+        default=DEFAULT_CACHE_PATH,
+        help="Path to the on-disk embedding cache (empty string disables it)",
+    )
+    parser.add_argument(
+        "--ivf-lists",
+        type=int,
+        default=None,
+        help="Build an IVF index with this many lists when saving",
+    )
     args = parser.parse_args()
+    cache = EmbeddingCache(args.embedding_cache) if args.embedding_cache else None
+
+    if args.convert:
+        for name in ["groups", "products", "colors"]:
+            npz_path = os.path.join("catalog_db2", f"{name}.npz")
+            if os.path.isfile(npz_path):
+                collection = Collection(
+                    npz_path, scan_dims=args.scan_dims, backend=args.backend
+                )
+                save_collection(collection, os.path.join("catalog_db2", name), args)
+        save_group_index()
+        return
+    if args.product_data is None or args.index_data is None:
+        parser.error("product_data and index_data are required")
 
     with open(args.product_data, "r") as f:
         product_data = json.load(f)
     with open(args.index_data, "r") as f:
         aggr_data = json.load(f)
 
+    product_types = group_product_types(product_data)
+
     if args.groups:
         gs = []
         for group_name, group_dict in product_data["product_group_db"].items():
@@ -42,29 +136,53 @@ def main():
                 products=group_dict["AH PRODUCT"],
                 colors=group_dict["AH PRODUCT ALL COLOURS"],
                 description=group_dict["AH PRODUCT GROUP DESCRIPTION"],
+                product_types=product_types.get(group_name, []),
             )
             gs.append(prod)
-        groups = Collection()
-        groups.add_items(
-            [p.__dict__ for p in gs],
-            [p.description for p in gs],
+        groups = Collection(
+            embed_size=args.embed_size,
+            scan_dims=args.scan_dims,
+            cache=cache,
+            backend=args.backend,
+            name="groups",
         )
-        groups.save("catalog_db2/groups.npz")
+        groups.add_items_streaming(
+            ((p.__dict__, p.description) for p in gs),
+            chunk_size=args.chunk_size,
+        )
+        save_collection(groups, "catalog_db2/groups", args)
 
     if args.colors:
         cols = set()
         for group_dict in product_data["product_group_db"].values():
             cols = cols.union(set(group_dict["AH PRODUCT ALL COLOURS"]))
         cols = list(cols)
-        colors = Collection()
-        colors.add_items(cols, cols)
-        colors.save("catalog_db2/colors.npz")
+        colors = Collection(
+            embed_size=args.embed_size,
+            scan_dims=args.scan_dims,
+            cache=cache,
+            backend=args.backend,
+            name="colors",
+        )
+        colors.add_items_streaming(
+            ((c, c) for c in cols),
+            chunk_size=args.chunk_size,
+        )
+        save_collection(colors, "catalog_db2/colors", args)
 
     if args.products:
-        prods = set()
-        for group_dict in product_data["product_group_db"].values():
-            prods = prods.union(set(group_dict["AH PRODUCT"]))
-        prods = list(prods)
+        # parent groups, colours and product types are stored with each product
+        # so that searches can be filtered on them (see Collection.search_many)
+        parents: dict[str, dict[str, set]] = {}
+        for group_name, group_dict in product_data["product_group_db"].items():
+            for p in group_dict["AH PRODUCT"]:
+                attrs = parents.setdefault(
+                    p, {"groups": set(), "colors": set(), "product_types": set()}
+                )
+                attrs["groups"].add(group_name)
+                attrs["colors"].update(group_dict["AH PRODUCT ALL COLOURS"])
+                attrs["product_types"].update(product_types.get(group_name, []))
+        prods = list(parents)
 
         url_map = {}
         for item in aggr_data:
@@ -72,11 +190,32 @@ def main():
 
         metadatas = []
         for p in prods:
-            metadatas.append({"name": p, "url": url_map[p] if p in url_map else ""})
+            metadatas.append(
+                {
+                    "name": p,
+                    "url": url_map[p] if p in url_map else "",
+                    **{key: sorted(values) for key, values in parents[p].items()},
+                }
+            )
+
+        products = Collection(
+            embed_size=args.embed_size,
+            scan_dims=args.scan_dims,
+            cache=cache,
+            backend=args.backend,
+            name="products",
+        )
+        products.add_items_streaming(
+            zip(metadatas, prods),
+            chunk_size=args.chunk_size,
+        )
+        save_collection(products, "catalog_db2/products", args)
+
+    if args.groups or args.products or args.colors:
+        save_group_index()
 
-        products = Collection()
-        products.add_items(metadatas, prods)
-        products.save("catalog_db2/products.npz")
+    if cache is not None:
+        print(f"Embedding cache: {cache.stats()}")
 
 
 if __name__ == "__main__":
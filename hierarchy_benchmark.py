@@ -0,0 +1,78 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from catalog import Catalog
+from embedding_cache import DEFAULT_CACHE_PATH, EmbeddingCache
+
+
+def time_queries(catalog: Catalog, query_matrix: np.ndarray):
+    results, latencies = [], []
+    for query_embed in query_matrix:
+        start = time.perf_counter()
+        results.append(catalog.query(query_embed))
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    return results, np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Latency of Catalog.query with the Chroma and numpy backends"
+    )
+    parser.add_argument("catalog", help="Path to the Chroma catalog directory")
+    parser.add_argument(
+        "--queries",
+        default=None,
+        help="Text file with one query per line (default: sample of product vectors)",
+    )
+    parser.add_argument("--sample", type=int, default=200)
+    parser.add_argument("--n-results", type=int, default=10)
+    args = parser.parse_args()
+
+    cache = EmbeddingCache(DEFAULT_CACHE_PATH)
+    chroma = Catalog(args.catalog, embedding_cache=cache, search_backend="chroma")
+    numpy_catalog = Catalog(args.catalog, embedding_cache=cache, search_backend="numpy")
+
+    start = time.perf_counter()
+    hierarchy = numpy_catalog.hierarchy
+    load_ms = (time.perf_counter() - start) * 1000.0
+
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        query_matrix = np.vstack(chroma.embedding_function(texts))
+    else:
+        products = hierarchy.levels["product"].embeddings
+        rng = np.random.default_rng(0)
+        n = min(args.sample, len(products))
+        query_matrix = products[np.sort(rng.choice(len(products), n, replace=False))]
+
+    report = {"queries": len(query_matrix), "numpy_load_ms": load_ms}
+    outputs = {}
+    for name, catalog in [("chroma", chroma), ("numpy", numpy_catalog)]:
+        catalog.default_n_results = args.n_results
+        # repeated queries would be timed as cache hits
+        catalog.query_cache.max_entries = 0
+        time_queries(catalog, query_matrix[:5])  # warm up
+        outputs[name], latencies = time_queries(catalog, query_matrix)
+        report[name] = {
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "mean_ms": float(latencies.mean()),
+        }
+    # HNSW is approximate, so the product lists may differ slightly
+    report["same_top_product"] = float(
+        np.mean(
+            [
+                c["product"]["ids"][:1] == n["product"]["ids"][:1]
+                for c, n in zip(outputs["chroma"], outputs["numpy"])
+            ]
+        )
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
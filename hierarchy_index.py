@@ -0,0 +1,162 @@
+from typing import List
+
+import numpy as np
+
+LEVELS = ["category", "prod_family", "prod_group", "product"]
+
+
+def _csr(parent_rows: np.ndarray, n_parents: int):
+    """Child rows of every parent row, grouped CSR-style."""
+    has_parent = parent_rows >= 0
+    children = np.flatnonzero(has_parent)
+    order = np.argsort(parent_rows[children], kind="stable")
+    offsets = np.zeros(n_parents + 1, dtype=np.int64)
+    np.cumsum(
+        np.bincount(parent_rows[children], minlength=n_parents), out=offsets[1:]
+    )
+    return offsets, children[order]
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    if k < len(scores):
+        top = np.argpartition(-scores, k)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class HierarchyLevel:
+    def __init__(self, ids: list[str], metadatas: list[dict], embeddings: np.ndarray):
+        self.ids = ids
+        self.rows = {id: i for i, id in enumerate(ids)}
+        self.metadatas = metadatas
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.embeddings = embeddings / norms
+        # rows of this level's parents, and of the children of each row
+        self.parent_rows = np.full(len(ids), -1, dtype=np.int64)
+        self.child_offsets = np.zeros(1, dtype=np.int64)
+        self.child_rows = np.empty(0, dtype=np.int64)
+
+    def children_of(self, rows) -> np.ndarray:
+        segments = [
+            self.child_rows[self.child_offsets[r] : self.child_offsets[r + 1]]
+            for r in rows
+        ]
+        return np.concatenate(segments or [np.empty(0, dtype=np.int64)])
+
+
+class NumpyHierarchy:
+    """
+    All four catalog levels as normalised matrices with parent->child row
+    arrays. Answers Catalog's per-level queries with one matrix product over
+    the children of the requested parents, returning Chroma's cosine
+    distances (1 - similarity).
+    """
+
+    def __init__(self, levels: dict[str, HierarchyLevel]):
+        self.levels = levels
+        for parent, child in zip(LEVELS, LEVELS[1:]):
+            p, c = levels[parent], levels[child]
+            c.parent_rows = np.array(
+                [p.rows.get(m.get("parent"), -1) for m in c.metadatas], dtype=np.int64
+            )
+            p.child_offsets, p.child_rows = _csr(c.parent_rows, len(p.ids))
+
+    @classmethod
+    def from_collections(cls, collections: dict) -> "NumpyHierarchy":
+        levels = {}
+        for name in LEVELS:
+            data = collections[name].get(include=["embeddings", "metadatas"])
+            levels[name] = HierarchyLevel(
+                list(data["ids"]),
+                [dict(m or {}) for m in data["metadatas"]],
+                np.asarray(data["embeddings"]).reshape(len(data["ids"]), -1),
+            )
+        return cls(levels)
+
+    def candidate_rows(self, level: str, where: dict | None) -> np.ndarray | None:
+        if where is None:
+            return None
+        if set(where) != {"parent"} or set(where["parent"]) != {"$in"}:
+            raise ValueError(f"Unsupported where clause {where}")
+        index = LEVELS.index(level)
+        assert index > 0, f"{level} has no parent level"
+        parent = self.levels[LEVELS[index - 1]]
+        parent_rows = sorted(
+            parent.rows[p] for p in where["parent"]["$in"] if p in parent.rows
+        )
+        return np.sort(parent.children_of(parent_rows))
+
+    def query(
+        self,
+        level: str,
+        query_embed: np.ndarray,
+        where: dict | None,
+        n_results: int,
+        include: List[str],
+    ):
+        lvl = self.levels[level]
+        rows = self.candidate_rows(level, where)
+        embeddings = lvl.embeddings if rows is None else lvl.embeddings[rows]
+        query_embed = np.asarray(query_embed, dtype=np.float32)
+        scores = embeddings.dot(query_embed / np.linalg.norm(query_embed))
+        top = _top(scores, n_results)
+        selected = top if rows is None else rows[top]
+        ids = [lvl.ids[r] for r in selected]
+        metas, dists = None, None
+        if "metadatas" in include:
+            metas = [dict(lvl.metadatas[r]) for r in selected]
+        if "distances" in include:
+            dists = (1.0 - scores[top]).tolist()
+        return ids, metas, dists
+
+    def beam_search(self, query_embed: np.ndarray, beam_width: int, k: int):
+        """
+        Keep the beam_width best partial paths at each level, scored by the
+        mean similarity of their nodes, and return the k best complete
+        category->family->group->product paths. Each level scores only the
+        children of the beam, so the cost is bounded by the beam, not the
+        catalog size.
+        """
+        query_embed = np.asarray(query_embed, dtype=np.float32)
+        query_embed = query_embed / np.linalg.norm(query_embed)
+        top_level = self.levels[LEVELS[0]]
+        paths = np.arange(len(top_level.ids))[:, None]
+        scores = top_level.embeddings.dot(query_embed)
+        for depth, (parent_name, name) in enumerate(zip(LEVELS, LEVELS[1:]), 2):
+            keep = _top(scores, beam_width)
+            paths, scores = paths[keep], scores[keep]
+            parent, level = self.levels[parent_name], self.levels[name]
+
+            # children of all beam nodes in one gather
+            beam = paths[:, -1]
+            starts = parent.child_offsets[beam]
+            counts = parent.child_offsets[beam + 1] - starts
+            segment_starts = np.repeat(starts - np.cumsum(counts) + counts, counts)
+            children = parent.child_rows[segment_starts + np.arange(counts.sum())]
+            beam_of_child = np.repeat(np.arange(len(beam)), counts)
+
+            sims = level.embeddings[children].dot(query_embed)
+            scores = (scores[beam_of_child] * (depth - 1) + sims) / depth
+            paths = np.column_stack([paths[beam_of_child], children])
+
+        keep = _top(scores, k)
+        products = self.levels[LEVELS[-1]]
+        return [
+            {
+                "id": products.ids[path[-1]],
+                "score": float(score),
+                "path": {
+                    name: self.levels[name].ids[row] for name, row in zip(LEVELS, path)
+                },
+                "metadata": dict(products.metadatas[path[-1]]),
+            }
+            for path, score in zip(paths[keep], scores[keep])
+        ]
+
+    def fetch_metadata(self, level: str, ids: List[str]) -> List[dict]:
+        lvl = self.levels[level]
+        return [dict(lvl.metadatas[lvl.rows[id]]) for id in ids]
@@ -0,0 +1,165 @@
+__import__("pysqlite3")
+import sys
+
+sys.modules["sqlite3"] = sys.modules.pop("pysqlite3")
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+from chromadb.config import Settings
+
+from hierarchy_index import LEVELS
+
+ADD_BATCH = 1000
+
+
+def dir_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def load_levels(catalog_path: str) -> dict[str, tuple[list[str], np.ndarray]]:
+    """Ids and stored embeddings of every level, so no embedding calls are made."""
+    client = chromadb.PersistentClient(
+        path=catalog_path, settings=Settings(anonymized_telemetry=False)
+    )
+    levels = {}
+    for name in LEVELS:
+        data = client.get_collection(name).get(include=["embeddings"])
+        embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+        levels[name] = (list(data["ids"]), embeddings)
+    return levels
+
+
+def exact_top_k(embeddings: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    normed = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    scores = queries.dot(normed.T)
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return top
+
+
+def benchmark_level(
+    ids: list[str],
+    embeddings: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    ef_construction: int,
+    max_neighbors: int,
+    ef_searches: list[int],
+) -> list[dict]:
+    work_dir = tempfile.mkdtemp(prefix="hnsw_benchmark_")
+    try:
+        client = chromadb.PersistentClient(
+            path=work_dir, settings=Settings(anonymized_telemetry=False)
+        )
+        collection = client.create_collection(
+            name="bench",
+            configuration={  # type: ignore
+                "hnsw": {
+                    "space": "cosine",
+                    "ef_construction": ef_construction,
+                    "max_neighbors": max_neighbors,
+                }
+            },
+            embedding_function=None,
+        )
+        start = time.perf_counter()
+        for i in range(0, len(ids), ADD_BATCH):
+            collection.add(
+                ids=ids[i : i + ADD_BATCH],
+                embeddings=embeddings[i : i + ADD_BATCH],  # type: ignore
+            )
+        build_s = time.perf_counter() - start
+        index_bytes = dir_size(work_dir)
+
+        exact = exact_top_k(embeddings, queries, k)
+        row_of = {id: i for i, id in enumerate(ids)}
+        rows = []
+        for ef_search in ef_searches:
+            collection.modify(
+                configuration={"hnsw": {"ef_search": ef_search}}  # type: ignore
+            )
+            latencies, recalls = [], []
+            for query, expected in zip(queries, exact):
+                start = time.perf_counter()
+                result = collection.query(
+                    query_embeddings=[query], n_results=len(expected), include=[]
+                )
+                latencies.append((time.perf_counter() - start) * 1000.0)
+                found = {row_of[id] for id in result["ids"][0]}
+                recalls.append(len(found.intersection(expected)) / len(expected))
+            rows.append(
+                {
+                    "ef_construction": ef_construction,
+                    "max_neighbors": max_neighbors,
+                    "ef_search": ef_search,
+                    "build_s": build_s,
+                    "index_bytes": index_bytes,
+                    "p50_ms": float(np.percentile(latencies, 50)),
+                    "p95_ms": float(np.percentile(latencies, 95)),
+                    "recall": float(np.mean(recalls)),
+                }
+            )
+        return rows
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build time, size, latency and recall@k of Chroma HNSW settings"
+    )
+    parser.add_argument("catalog", help="Chroma catalog to take embeddings from")
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--max-neighbors", type=int, nargs="+", default=[16, 32])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--sample", type=int, default=200)
+    parser.add_argument("--output", default="hnsw_benchmark.json")
+    args = parser.parse_args()
+
+    levels = load_levels(args.catalog)
+    # product vectors stand in for queries; they exercise every level
+    _, products = levels["product"]
+    rng = np.random.default_rng(0)
+    n = min(args.sample, len(products))
+    queries = products[np.sort(rng.choice(len(products), n, replace=False))]
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+    report = {"top_k": args.top_k, "queries": n, "levels": {}}
+    for name, (ids, embeddings) in levels.items():
+        report["levels"][name] = [
+            row
+            for ef_construction, max_neighbors in itertools.product(
+                args.ef_construction, args.max_neighbors
+            )
+            for row in benchmark_level(
+                ids,
+                embeddings,
+                queries,
+                args.top_k,
+                ef_construction,
+                max_neighbors,
+                args.ef_search,
+            )
+        ]
+        print(f"{name}: done", file=sys.stderr)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
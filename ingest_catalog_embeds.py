@@ -3,11 +3,13 @@ import os
 import pandas as pd
 
 from catalog import Catalog
+from embedding_cache import DEFAULT_CACHE_PATH, EmbeddingCache
 
 DATA_DIR = "data"
 CATALOG_DIR = "catalog_db"
 
-catalog = Catalog(CATALOG_DIR)
+embedding_cache = EmbeddingCache(DEFAULT_CACHE_PATH)
+catalog = Catalog(CATALOG_DIR, embedding_cache=embedding_cache)
 
 pd_read_opts = {
     "orient": "records",
@@ -20,21 +22,32 @@ for collection_name, data_file in [
     ("prod_group", os.path.join(DATA_DIR, "prod_group.json")),
 ]:
     df = pd.read_json(data_file, **pd_read_opts)
-    catalog.upsert_documents(
+    # only new or changed documents are embedded
+    counts = catalog.upsert_documents(
         collection=collection_name,
         ids=df["name"].tolist(),
         documents=df["text"].tolist(),
         metadatas=df.to_dict(orient="records"),
     )
+    counts["deleted"] = catalog.delete_missing(collection_name, df["name"].tolist())
+    print(f"{collection_name}: {counts}")
 
 df = pd.read_json("data/product.json", **pd_read_opts)
 
 chunk_size = 200
+product_ids = [str(i) for i in df.index.tolist()]
+counts = {"embedded": 0, "metadata_updated": 0, "unchanged": 0}
 for i in range(0, len(df), chunk_size):
     chunk = df.iloc[i : i + chunk_size]
-    catalog.upsert_documents(
+    chunk_counts = catalog.upsert_documents(
         collection="product",
-        ids=[str(i) for i in chunk.index.tolist()],
+        ids=product_ids[i : i + chunk_size],
         documents=chunk["text"].tolist(),
         metadatas=chunk.to_dict(orient="records"),
     )
+    for key, value in chunk_counts.items():
+        counts[key] += value
+counts["deleted"] = catalog.delete_missing("product", product_ids)
+print(f"product: {counts}")
+
+print(f"Embedding cache: {embedding_cache.stats()}")
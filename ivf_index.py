@@ -0,0 +1,116 @@
+import numpy as np
+
+
+def spherical_kmeans(
+    embeddings: np.ndarray,
+    n_lists: int,
+    iters: int = 20,
+    sample_size: int | None = None,
+    seed: int = 0,
+    block_rows: int = 16384,
+) -> np.ndarray:
+    """k-means on the unit sphere; returns normalised centroids (n_lists, d)."""
+    rng = np.random.default_rng(seed)
+    n = len(embeddings)
+    assert 0 < n_lists <= n
+    if sample_size is None:
+        sample_size = 256 * n_lists
+    sample_rows = np.sort(rng.choice(n, min(n, sample_size), replace=False))
+    data = np.asarray(embeddings[sample_rows], dtype=np.float32)
+
+    centroids = data[rng.choice(len(data), n_lists, replace=False)].copy()
+    for _ in range(iters):
+        assign = assign_lists(data, centroids, block_rows)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        counts = np.bincount(assign, minlength=n_lists)
+        # re-seed empty lists from random points
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = sums / norms
+    return centroids
+
+
+def assign_lists(
+    embeddings: np.ndarray, centroids: np.ndarray, block_rows: int = 16384
+) -> np.ndarray:
+    assign = np.empty(len(embeddings), dtype=np.int64)
+    for start in range(0, len(embeddings), block_rows):
+        block = np.asarray(embeddings[start : start + block_rows], dtype=np.float32)
+        assign[start : start + block_rows] = block.dot(centroids.T).argmax(axis=1)
+    return assign
+
+
+class IVFIndex:
+    """
+    Inverted-file index: centroids plus posting lists stored CSR-style, with
+    `rows[offsets[i]:offsets[i + 1]]` holding the (sorted) rows of list i.
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, rows: np.ndarray):
+        assert len(offsets) == len(centroids) + 1
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        n_lists: int | None = None,
+        iters: int = 20,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(len(embeddings))))
+        n_lists = min(n_lists, len(embeddings))
+        centroids = spherical_kmeans(embeddings, n_lists, iters=iters, seed=seed)
+        assign = assign_lists(embeddings, centroids)
+        # stable sort keeps rows ascending inside each list
+        rows = np.argsort(assign, kind="stable").astype(np.int64)
+        counts = np.bincount(assign, minlength=n_lists)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(centroids.astype(np.float32), offsets, rows)
+
+    def probe(self, query_embedding: np.ndarray, nprobe: int) -> np.ndarray:
+        """Sorted rows of the nprobe lists nearest to the query."""
+        nprobe = min(nprobe, self.n_lists)
+        scores = self.centroids.dot(query_embedding)
+        lists = np.argpartition(scores, self.n_lists - nprobe)[self.n_lists - nprobe :]
+        rows = np.concatenate(
+            [self.rows[self.offsets[i] : self.offsets[i + 1]] for i in lists]
+        )
+        return np.sort(rows)
+
+    def _with_lists(self, lists: np.ndarray, rows: np.ndarray) -> "IVFIndex":
+        order = np.lexsort((rows, lists))
+        offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(lists, minlength=self.n_lists), out=offsets[1:])
+        return IVFIndex(self.centroids, offsets, rows[order])
+
+    def _row_lists(self) -> np.ndarray:
+        return np.repeat(np.arange(self.n_lists), np.diff(self.offsets))
+
+    def extended(self, embeddings: np.ndarray, start: int) -> "IVFIndex":
+        """New index with rows start.. assigned to the nearest existing lists."""
+        lists = np.concatenate(
+            [self._row_lists(), assign_lists(embeddings, self.centroids)]
+        )
+        rows = np.concatenate(
+            [self.rows, np.arange(start, start + len(embeddings), dtype=np.int64)]
+        )
+        return self._with_lists(lists, rows)
+
+    def compacted(self, keep: np.ndarray) -> "IVFIndex":
+        """New index over the rows where keep is True, renumbered densely."""
+        new_row = np.cumsum(keep) - 1
+        live = keep[self.rows]
+        return self._with_lists(self._row_lists()[live], new_row[self.rows[live]])
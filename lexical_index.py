@@ -0,0 +1,167 @@
+import json
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+VOCAB_FILE = "bm25_vocab.json"
+OFFSETS_FILE = "bm25_offsets.npy"
+DOC_IDS_FILE = "bm25_doc_ids.npy"
+TFS_FILE = "bm25_tfs.npy"
+DOC_LENS_FILE = "bm25_doc_lens.npy"
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip diacritics ("Jemné betonové" -> "jemne betonove")."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(fold(text))
+
+
+class BM25Index:
+    """
+    Okapi BM25 over folded tokens. Postings are CSR arrays: the documents of
+    term t are doc_ids[offsets[t]:offsets[t + 1]] with frequencies in tfs.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(
+        self,
+        vocab: dict[str, int],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_lens: np.ndarray,
+    ):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lens = doc_lens
+        self.avg_doc_len = float(doc_lens.mean()) if len(doc_lens) else 0.0
+
+    def __len__(self):
+        return len(self.doc_lens)
+
+    @classmethod
+    def empty(cls) -> "BM25Index":
+        return cls(
+            {},
+            np.zeros(1, dtype=np.int64),
+            np.empty(0, dtype=np.int32),
+            np.empty(0, dtype=np.float32),
+            np.empty(0, dtype=np.float32),
+        )
+
+    @classmethod
+    def build(cls, token_lists: list[list[str]]) -> "BM25Index":
+        return cls.empty().extended(token_lists)
+
+    def extended(self, token_lists: list[list[str]]) -> "BM25Index":
+        """New index with documents appended; existing postings are merged once."""
+        vocab = dict(self.vocab)
+        terms = [np.repeat(np.arange(len(self.vocab)), np.diff(self.offsets))]
+        doc_ids, tfs = [self.doc_ids.astype(np.int64)], [self.tfs]
+        doc_lens = [self.doc_lens]
+        for doc, tokens in enumerate(token_lists, start=len(self)):
+            counts: dict[int, int] = {}
+            for token in tokens:
+                term = vocab.setdefault(token, len(vocab))
+                counts[term] = counts.get(term, 0) + 1
+            terms.append(np.fromiter(counts.keys(), dtype=np.int64, count=len(counts)))
+            doc_ids.append(np.full(len(counts), doc, dtype=np.int64))
+            tfs.append(
+                np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            )
+            doc_lens.append(np.array([len(tokens)], dtype=np.float32))
+
+        all_terms = np.concatenate(terms)
+        all_docs = np.concatenate(doc_ids)
+        order = np.lexsort((all_docs, all_terms))
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(all_terms, minlength=len(vocab)), out=offsets[1:])
+        return BM25Index(
+            vocab,
+            offsets,
+            all_docs[order].astype(np.int32),
+            np.concatenate(tfs)[order],
+            np.concatenate(doc_lens),
+        )
+
+    def scores(self, query_text: str) -> np.ndarray:
+        scores = np.zeros(len(self), dtype=np.float32)
+        n = len(self)
+        for token in set(tokenize(query_text)):
+            term = self.vocab.get(token)
+            if term is None:
+                continue
+            postings = slice(self.offsets[term], self.offsets[term + 1])
+            docs, tf = self.doc_ids[postings], self.tfs[postings]
+            df = len(docs)
+            idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (
+                1.0 - self.b + self.b * self.doc_lens[docs] / self.avg_doc_len
+            )
+            scores[docs] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return scores
+
+    def compacted(self, keep: np.ndarray) -> "BM25Index":
+        """New index over the documents where keep is True, renumbered densely."""
+        new_doc = np.cumsum(keep) - 1
+        terms = np.repeat(np.arange(len(self.vocab)), np.diff(self.offsets))
+        live = keep[self.doc_ids]
+        offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms[live], minlength=len(self.vocab)), out=offsets[1:])
+        return BM25Index(
+            self.vocab,
+            offsets,
+            new_doc[self.doc_ids[live]].astype(np.int32),
+            np.asarray(self.tfs)[live],
+            np.asarray(self.doc_lens)[keep],
+        )
+
+    @classmethod
+    def load(cls, dir_path: str) -> "BM25Index":
+        with open(os.path.join(dir_path, VOCAB_FILE), "r", encoding="utf-8") as f:
+            terms = json.load(f)
+        return cls(
+            {t: i for i, t in enumerate(terms)},
+            np.load(os.path.join(dir_path, OFFSETS_FILE)),
+            np.load(os.path.join(dir_path, DOC_IDS_FILE), mmap_mode="r"),
+            np.load(os.path.join(dir_path, TFS_FILE), mmap_mode="r"),
+            np.load(os.path.join(dir_path, DOC_LENS_FILE)),
+        )
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        return {
+            OFFSETS_FILE: self.offsets,
+            DOC_IDS_FILE: self.doc_ids,
+            TFS_FILE: self.tfs,
+            DOC_LENS_FILE: self.doc_lens,
+        }
+
+    def vocab_terms(self) -> list[str]:
+        terms = [""] * len(self.vocab)
+        for term, i in self.vocab.items():
+            terms[i] = term
+        return terms
+
+
+def reciprocal_rank_fusion(rankings: list[np.ndarray], k: int = 60):
+    """Fuse ranked row lists; returns (rows, fused scores) best first."""
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (k + rank + 1)
+    rows = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+    scores = np.fromiter(fused.values(), dtype=np.float32, count=len(fused))
+    order = np.argsort(-scores, kind="stable")
+    return rows[order], scores[order]
@@ -0,0 +1,75 @@
+import os
+import threading
+
+from embedding_cache import EmbeddingCache
+
+
+class LocalEmbedder:
+    """
+    CPU-only ONNX embedder (all-MiniLM-L6-v2 via Chroma's bundled model).
+    The model is downloaded once into ~/.cache/chroma; queries need no network.
+    """
+
+    model = "all-MiniLM-L6-v2"
+    embed_size = 384
+    dimensions = None
+
+    def __init__(
+        self,
+        num_threads: int | None = None,
+        batch_size: int = 32,
+        cache: EmbeddingCache | None = None,
+    ):
+        from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import (
+            ONNXMiniLM_L6_V2,
+        )
+
+        self.num_threads = num_threads
+        self.batch_size = batch_size
+        self.cache = cache
+        self._onnx = ONNXMiniLM_L6_V2(preferred_providers=["CPUExecutionProvider"])
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def __call__(self, texts: str | list[str]):
+        if isinstance(texts, str):
+            return self._embed([texts])[0]
+        return self._embed(texts)
+
+    def _embed(self, texts: list[str]):
+        if self.cache is not None:
+            return self.cache.embed(
+                self.model, self.dimensions, texts, self._embed_uncached
+            )
+        return self._embed_uncached(texts)
+
+    def _embed_uncached(self, texts: list[str]):
+        self._ensure_session()
+        return self._onnx._forward(list(texts), batch_size=self.batch_size)
+
+    def _ensure_session(self):
+        with self._lock:
+            if self._ready:
+                return
+            self._onnx._download_model_if_not_exists()
+            if self.num_threads is not None:
+                # Chroma builds the session with default threading; replace it
+                # with one bounded to num_threads
+                ort = self._onnx.ort
+                options = ort.SessionOptions()
+                options.log_severity_level = 3
+                options.graph_optimization_level = (
+                    ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                )
+                options.intra_op_num_threads = self.num_threads
+                options.inter_op_num_threads = 1
+                self._onnx.__dict__["model"] = ort.InferenceSession(
+                    os.path.join(
+                        self._onnx.DOWNLOAD_PATH,
+                        self._onnx.EXTRACTED_FOLDER_NAME,
+                        "model.onnx",
+                    ),
+                    providers=["CPUExecutionProvider"],
+                    sess_options=options,
+                )
+            self._ready = True
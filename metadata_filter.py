@@ -0,0 +1,96 @@
+from collections.abc import Hashable, Sequence
+
+import numpy as np
+
+
+def _values(item, key: str) -> list:
+    if isinstance(item, str):
+        # plain string items (e.g. colours) are addressed by their name
+        return [item] if key == "name" else []
+    value = item.get(key)
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [v for v in value if isinstance(v, Hashable)]
+    return [value] if isinstance(value, Hashable) else []
+
+
+class AttributeIndex:
+    """
+    Sorted row indexes per (metadata key, value), stored CSR-style per key and
+    combined with Chroma-style where expressions, e.g.
+    {"$and": [{"groups": {"$in": ["KLASIKO"]}}, {"colors": "přírodní"}]}.
+    List-valued metadata match when any element matches. Boolean masks are
+    only built while evaluating, for the values an expression names.
+    """
+
+    def __init__(self, items: Sequence):
+        self.items = items
+        # key -> (value -> slot, offsets, rows)
+        self._postings: dict[str, tuple[dict, np.ndarray, np.ndarray]] = {}
+
+    def index_keys(self, *keys: str):
+        for key in keys:
+            self.postings(key)
+
+    def postings(self, key: str) -> tuple[dict, np.ndarray, np.ndarray]:
+        if key not in self._postings:
+            slots: dict = {}
+            value_slots, value_rows = [], []
+            for i, item in enumerate(self.items):
+                for value in dict.fromkeys(_values(item, key)):
+                    value_slots.append(slots.setdefault(value, len(slots)))
+                    value_rows.append(i)
+            value_slots = np.asarray(value_slots, dtype=np.int64)
+            order = np.argsort(value_slots, kind="stable")
+            offsets = np.zeros(len(slots) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(value_slots, minlength=len(slots)), out=offsets[1:])
+            rows = np.asarray(value_rows, dtype=np.int64)[order]
+            self._postings[key] = (slots, offsets, rows)
+        return self._postings[key]
+
+    def rows(self, key: str, value) -> np.ndarray:
+        """Rows whose metadata key holds value, ascending."""
+        slots, offsets, rows = self.postings(key)
+        slot = slots.get(value) if isinstance(value, Hashable) else None
+        if slot is None:
+            return rows[:0]
+        return rows[offsets[slot] : offsets[slot + 1]]
+
+    def mask(self, key: str, value) -> np.ndarray:
+        result = np.zeros(len(self.items), dtype=bool)
+        result[self.rows(key, value)] = True
+        return result
+
+    def _any_of(self, key: str, values) -> np.ndarray:
+        result = np.zeros(len(self.items), dtype=bool)
+        for value in values:
+            result[self.rows(key, value)] = True
+        return result
+
+    def evaluate(self, where: dict) -> np.ndarray:
+        result = np.ones(len(self.items), dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for sub in condition:
+                    result &= self.evaluate(sub)
+            elif key == "$or":
+                any_mask = np.zeros(len(self.items), dtype=bool)
+                for sub in condition:
+                    any_mask |= self.evaluate(sub)
+                result &= any_mask
+            elif isinstance(condition, dict):
+                for op, operand in condition.items():
+                    if op == "$eq":
+                        result &= self.mask(key, operand)
+                    elif op == "$ne":
+                        result &= ~self.mask(key, operand)
+                    elif op == "$in":
+                        result &= self._any_of(key, operand)
+                    elif op == "$nin":
+                        result &= ~self._any_of(key, operand)
+                    else:
+                        raise ValueError(f"Unsupported filter operator {op}")
+            else:
+                result &= self.mask(key, condition)
+        return result
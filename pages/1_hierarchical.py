@@ -1,8 +1,9 @@
+import itertools
 import os
 
 import streamlit as st
 
-from catalog import Catalog
+import resources
 
 st.set_page_config(
     page_title="BEST AI Search Engine",
@@ -63,7 +64,7 @@ def new_query():
 
 def main():
     path = "catalog_db"
-    catalog = Catalog(path)
+    catalog = resources.catalog(path)
 
     with st.form("query_form"):
         query_text = st.text_area(
@@ -89,12 +90,20 @@ def main():
             st.markdown(" ")
 
             if namespace not in st.session_state:
+                # only products render metadata; other levels show ids
+                include = ["distances"]
+                if namespace == "product":
+                    include.append("metadatas")
                 if namespace == "category":
-                    ids, metas, dists = qf(st.session_state["query"])
+                    ids, metas, dists = qf(
+                        st.session_state["query"], n_results=50, include=include
+                    )
                 else:
                     ids, metas, dists = qf(
                         st.session_state["query"],
                         st.session_state[parent]["top"],
+                        n_results=50,
+                        include=include,
                     )
                 st.session_state[namespace] = {
                     "top": ids[0],
@@ -105,7 +114,7 @@ def main():
 
             for id, meta, dist in zip(
                 st.session_state[namespace]["ids"],
-                st.session_state[namespace]["metadatas"],
+                st.session_state[namespace]["metadatas"] or itertools.repeat(None),
                 st.session_state[namespace]["distances"],
             ):
                 if id == st.session_state[namespace]["top"]:
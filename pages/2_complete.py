@@ -2,15 +2,14 @@ import os
 
 import matplotlib.pyplot as plt
 import numpy as np
-from openai import OpenAI
 import pandas as pd
 from scipy.signal import find_peaks
 from scipy.stats import gaussian_kde
 import streamlit as st
 
-from catalog import Catalog
+import resources
 
-client = OpenAI()
+client = resources.openai_client()
 model = "gpt-4.1"
 
 st.set_page_config(
@@ -181,7 +180,7 @@ def filter_dupl(dists, metas):
 
 def main():
     path = "catalog_db"
-    catalog = Catalog(path)
+    catalog = resources.catalog(path)
 
     with st.form("query_form"):
         c1, c2 = st.columns([1, 1])
@@ -214,11 +213,15 @@ def main():
     if "query" not in st.session_state:
         return
     if "ids" not in st.session_state:
+        # the whole distance distribution drives the divider; metadata is
+        # fetched below only for the rows in the selected range
         (
             st.session_state["ids"],
-            st.session_state["metadatas"],
+            _,
             st.session_state["distances"],
-        ) = catalog.query_product(st.session_state["query"])
+        ) = catalog.query_product(
+            st.session_state["query"], n_results=1000, include=["distances"]
+        )
 
     x_grid, density, peaks, valleys = get_divider(st.session_state["distances"])
 
@@ -231,16 +234,15 @@ def main():
             plot_analysis(x_grid, density, peaks, valleys)
     with col1:
         dists = np.array(st.session_state["distances"])
-        metas = st.session_state["metadatas"]
-        for m in metas:
-            if "url" not in m:
-                m["url"] = None
 
         x0, x1 = st.session_state["range"]
         lt, gte = dists < x0, dists <= x1
         pre, pre_inc = sum(lt), sum(gte)
         dists = dists[pre:pre_inc]
-        metas = metas[pre:pre_inc]
+        metas = catalog.fetch_metadata("product", st.session_state["ids"][pre:pre_inc])
+        for m in metas:
+            if "url" not in m:
+                m["url"] = None
         dists, metas = filter_dupl(dists, metas)
 
         if st.session_state["verify_results"]:
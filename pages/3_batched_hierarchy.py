@@ -3,20 +3,19 @@ import os
 import matplotlib.figure as figure
 import matplotlib.pyplot as plt
 import numpy as np
-from openai import OpenAI
 import pandas as pd
 from scipy.signal import find_peaks
 from scipy.stats import gaussian_kde
 import streamlit as st
 
-from catalog import Catalog
+import resources
 
 INPUT_HEIGHT = 100
 OPENAI_MODEL = "gpt-4.1"
 VDB_PATH = "catalog_db"
 
-client = OpenAI()
-catalog = Catalog(VDB_PATH)
+client = resources.openai_client()
+catalog = resources.catalog(VDB_PATH)
 
 st.set_page_config(
     page_title="BEST AI Search Engine",
@@ -146,7 +145,10 @@ def plot_analysis(x_grid, dists, density, peaks, valleys, divider) -> figure.Fig
 def show_subgroup(_, parent, namespace, query_fn):
     # st.subheader(f"{i}. {namespace.upper().replace('_', ' ')}", anchor=False)
     if namespace not in st.session_state:
-        ids, metas, dists = query_fn(st.session_state["query_embed"], parent)
+        # every row is plotted and listed in the table
+        ids, metas, dists = query_fn(
+            st.session_state["query_embed"], parent, n_results=1000
+        )
         x_grid, density, peaks, valleys = kde_analysis(dists)
         threshold = x_grid[valleys[0]] if len(valleys) else x_grid.max() + 1e-5
         select = [d < threshold for d in dists]
@@ -1,6 +1,6 @@
 import streamlit as st
 
-from flat_catalog import Collection
+from shared_catalog import attach_group_search
 
 st.set_page_config(
     page_title="BEST AI Search Engine",
@@ -25,9 +25,7 @@ st.session_state["page"] = page
 
 
 def main():
-    groups = Collection("catalog_db2/groups.npz")
-    products = Collection("catalog_db2/products.npz")
-    colors = Collection("catalog_db2/colors.npz")
+    search = attach_group_search("catalog_db2")
 
     with st.form("query_form"):
         query_text = st.text_area(
@@ -38,28 +36,24 @@ def main():
         if st.form_submit_button("Submit", type="primary") and query_text != "":
             clear_state()
             with st.spinner("Processing query...", show_time=True):
-                st.session_state["query"] = groups.embedder(query_text)
+                st.session_state["query"] = search.groups.embedder(query_text)
     if "query" not in st.session_state:
         return
-    metas, dists = groups._search(st.session_state["query"])
-    colors, col_dists = colors._search(st.session_state["query"])
-    products, prod_dists = products._search(st.session_state["query"])
+    hits = search.search(st.session_state["query"])
 
     c1, c2 = st.columns([1, 3], gap="small")
     with c2.container(border=True):
         if "choice" not in st.session_state:
             st.session_state["choice"] = 0
-        m = metas[st.session_state["choice"]]
+        hit = hits[st.session_state["choice"]]
+        m = search.groups.items[hit.row]
         st.markdown(f"### {m['name']}")
 
-        # sort products and colors by col_dists and prod_dists
-        ps, cs = [], []
-        for p, d in zip(products, prod_dists):
-            if p["name"] in m["products"]:
-                ps.append((d, f"[{p['name']}]({p['url']})"))
-        for c, d in zip(colors, col_dists):
-            if c in m["colors"]:
-                cs.append((d, c))
+        # products of the selected group, already ranked by similarity
+        ps = []
+        for r, d in zip(hit.product_rows, hit.product_scores):
+            p = search.products.items[r]
+            ps.append((d, f"[{p['name']}]({p['url']})"))
 
         st.markdown("#### Products")
         st.table(ps)
@@ -67,10 +61,11 @@ def main():
         st.markdown("#### Description")
         st.markdown(m["description"])
 
-    for i, m in enumerate(metas):
+    for i, hit in enumerate(hits):
+        m = search.groups.items[hit.row]
         c1.button(
             f"__{m['name']}__",
-            help=f"Similarity: {dists[i]:.6f}",
+            help=f"Similarity: {hit.score:.6f}",
             width="stretch",
             type="primary" if i == st.session_state["choice"] else "secondary",
             on_click=lambda idx=i: st.session_state.update({"choice": idx}),
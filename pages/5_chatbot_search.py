@@ -1,4 +1,3 @@
-import json
 import os
 import typing as t
 import sys
@@ -9,6 +8,8 @@ import openai as oai
 import oai_batch
 
 import alternate_hierarchy.open_llm_resolver_v6 as v6
+import resources
+from shared_catalog import attach_hierarchy
 
 st.set_page_config(
     page_title="BEST AI Search Engine",
@@ -33,7 +34,7 @@ st.session_state["page"] = page
 
 def chatbot_resolver(query_text: str, alt_hierarchy_db: t.Dict, prog_bar):
     assert os.environ.get("OPENAI_API_KEY") is not None
-    client: oai.OpenAI = oai.OpenAI()
+    client: oai.OpenAI = resources.openai_client()
 
     request_offer_list = [{
         "CUSTOMER DESCRIPTION": query_text,
@@ -65,9 +66,8 @@ def chatbot_resolver(query_text: str, alt_hierarchy_db: t.Dict, prog_bar):
     return selected_products
 
 def main():
-    if "alt_hierarchy_db" not in st.session_state:
-        with open("data/alternative_hierarchy_db.json", "rt", encoding="utf-8") as f:
-            st.session_state["alt_hierarchy_db"] = json.load(f)
+    # shared read-only segment, one per host instead of a copy per session
+    alt_hierarchy_db = attach_hierarchy("data/alternative_hierarchy_db.json")
 
     with st.form("query_form"):
         query_text = st.text_area(
@@ -81,7 +81,7 @@ def main():
             prog_bar = st.progress(value=0, text="Looking for products...")
 
             with st.spinner("Processing query...", show_time=True):
-                st.session_state["response"] = chatbot_resolver(query_text, st.session_state["alt_hierarchy_db"], prog_bar)
+                st.session_state["response"] = chatbot_resolver(query_text, alt_hierarchy_db, prog_bar)
 
     if "response" not in st.session_state:
         return
@@ -93,7 +93,6 @@ def main():
     if "choice" not in st.session_state:
         st.session_state["choice"] = 0
 
-    alt_hierarchy_db = st.session_state["alt_hierarchy_db"]
     selected = st.session_state["response"][st.session_state["choice"]]
     prod_info = alt_hierarchy_db["product_db"][selected['PRODUCT']]
 
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+import numpy as np
+
+import config.configuration as cfg
+
+_MISSING = object()
+
+
+def query_key(query_embed, *parts) -> str:
+    """Hash of a query vector (as float32) and the other search arguments."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(query_embed, dtype=np.float32).tobytes())
+    h.update(json.dumps(parts, sort_keys=True, default=repr).encode("utf-8"))
+    return h.hexdigest()
+
+
+class QueryCache:
+    """
+    Bounded LRU cache of search results with an optional TTL, limited both by
+    entry count and by the bytes the callers report for each result. Entries
+    belong to a data version (see validate); a different version drops them
+    all, so results never outlive a re-ingest of the data they were computed
+    from.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_s: float | None = 300.0,
+        max_bytes: int | None = 64 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.version: Hashable = None
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries: OrderedDict[str, tuple[float, Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "QueryCache":
+        settings = cfg.get_search_settings()
+        max_mb = settings.query_cache_max_mb
+        return cls(
+            settings.query_cache_size,
+            settings.query_cache_ttl_s,
+            None if max_mb is None else max_mb * 1024 * 1024,
+        )
+
+    def validate(self, version: Hashable):
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.nbytes = 0
+                self.version = version
+
+    def get(self, key: str, default=None):
+        if self.max_entries <= 0:
+            return default
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and (
+                self.ttl_s is None or now - entry[0] < self.ttl_s
+            ):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                self._pop(key)
+            self.misses += 1
+            return default
+
+    def put(self, key: str, value, nbytes: int = 0):
+        """Cache value; nbytes is its size, counted against max_bytes."""
+        if self.max_entries <= 0:
+            return
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (time.monotonic(), value, nbytes)
+            self.nbytes += nbytes
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self.nbytes > self.max_bytes
+            ):
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key: str):
+        self.nbytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
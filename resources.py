@@ -0,0 +1,63 @@
+import threading
+from typing import Any, Callable
+
+from openai import OpenAI
+
+from embedding_cache import DEFAULT_CACHE_PATH, EmbeddingCache
+
+# Process-wide resources shared by all Streamlit sessions and script threads.
+# Each is built once on first use; invalidate() drops it so that the next
+# call rebuilds it (e.g. after re-ingesting a catalog).
+
+_resources: dict[tuple, Any] = {}
+_building: dict[tuple, threading.Lock] = {}
+_lock = threading.Lock()
+
+
+def resource(kind: str, key: str, factory: Callable[[], Any]):
+    resource_key = (kind, key)
+    with _lock:
+        if resource_key in _resources:
+            return _resources[resource_key]
+        build_lock = _building.setdefault(resource_key, threading.Lock())
+    # built outside the registry lock so that slow loads of different
+    # resources do not block each other; concurrent callers of the same one
+    # wait for the first build
+    with build_lock:
+        with _lock:
+            if resource_key in _resources:
+                return _resources[resource_key]
+        value = factory()
+        with _lock:
+            _resources[resource_key] = value
+        return value
+
+
+def invalidate(kind: str | None = None, key: str | None = None) -> int:
+    """Drop matching resources (all when kind is None); returns how many."""
+    with _lock:
+        stale = [
+            k
+            for k in _resources
+            if (kind is None or k[0] == kind) and (key is None or k[1] == key)
+        ]
+        for k in stale:
+            del _resources[k]
+        return len(stale)
+
+
+def openai_client() -> OpenAI:
+    return resource("openai_client", "", OpenAI)
+
+
+def embedding_cache(path: str = DEFAULT_CACHE_PATH) -> EmbeddingCache:
+    return resource("embedding_cache", path, lambda: EmbeddingCache(path))
+
+
+def catalog(path: str):
+    # imported here: catalog pulls in chromadb and requires OPENAI_API_KEY
+    from catalog import Catalog
+
+    return resource(
+        "catalog", path, lambda: Catalog(path, embedding_cache=embedding_cache())
+    )
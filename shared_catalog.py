@@ -0,0 +1,169 @@
+import fcntl
+import json
+import os
+from collections.abc import Mapping
+
+import numpy as np
+
+import resources
+from embedding_dispatcher import dispatching
+from flat_catalog import META_FILE, Collection, LazyItems, _replace_file
+from flat_group_search import GroupSearch
+
+SEGMENT_FORMAT_VERSION = 1
+LOCK_FILE = ".lock"
+
+# Collection directories (see Collection.save) are memory-mapped read-only, so
+# every process on a host shares one page-cache copy of the embeddings, items,
+# coarse matrix and postings. The hierarchy JSON is published into the same
+# kind of segment: one JSONL file per table plus row offsets and keys.
+
+
+def _table_files(dir_path: str, name: str):
+    return (
+        os.path.join(dir_path, f"{name}.jsonl"),
+        os.path.join(dir_path, f"{name}_offsets.npy"),
+        os.path.join(dir_path, f"{name}_keys.json"),
+    )
+
+
+def _source_stamp(json_path: str) -> dict:
+    stat = os.stat(json_path)
+    return {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+
+
+def _segment_meta(segment_dir: str) -> dict | None:
+    try:
+        with open(os.path.join(segment_dir, META_FILE), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def publish_hierarchy(json_path: str, segment_dir: str | None = None) -> str:
+    """
+    Publish alternative_hierarchy_db.json as a memory-mappable segment next to
+    it (or into segment_dir). Only the first process after a change of the
+    source file does the work; the others wait on the lock and reuse it.
+    """
+    if segment_dir is None:
+        segment_dir = os.path.splitext(json_path)[0]
+    os.makedirs(segment_dir, exist_ok=True)
+    stamp = _source_stamp(json_path)
+    with open(os.path.join(segment_dir, LOCK_FILE), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            meta = _segment_meta(segment_dir)
+            if meta is not None and all(meta.get(k) == v for k, v in stamp.items()):
+                return segment_dir
+
+            with open(json_path, "rt", encoding="utf-8") as f:
+                db = json.load(f)
+            tables, inline = [], {}
+            for name, table in db.items():
+                if not isinstance(table, dict):
+                    inline[name] = table
+                    continue
+                tables.append(name)
+                items_path, offsets_path, keys_path = _table_files(segment_dir, name)
+                offsets = np.zeros(len(table) + 1, dtype=np.int64)
+
+                def write_items(f, table=table, offsets=offsets):
+                    for i, value in enumerate(table.values()):
+                        line = json.dumps(value, ensure_ascii=False).encode("utf-8")
+                        f.write(line + b"\n")
+                        offsets[i + 1] = offsets[i] + len(line) + 1
+
+                _replace_file(items_path, write_items)
+                _replace_file(offsets_path, lambda f: np.save(f, offsets))
+                _replace_file(
+                    keys_path,
+                    lambda f, table=table: f.write(
+                        json.dumps(list(table), ensure_ascii=False).encode("utf-8")
+                    ),
+                )
+            meta = {
+                "format_version": SEGMENT_FORMAT_VERSION,
+                **stamp,
+                "tables": tables,
+                "inline": inline,
+            }
+            _replace_file(
+                os.path.join(segment_dir, META_FILE),
+                lambda f: f.write(
+                    json.dumps(meta, ensure_ascii=False, indent=2).encode("utf-8")
+                ),
+            )
+            return segment_dir
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class SharedTable(Mapping):
+    """Read-only table of a hierarchy segment; values are decoded on access."""
+
+    def __init__(self, segment_dir: str, name: str):
+        items_path, offsets_path, keys_path = _table_files(segment_dir, name)
+        with open(keys_path, "r", encoding="utf-8") as f:
+            self._rows = {key: i for i, key in enumerate(json.load(f))}
+        self._items = LazyItems(items_path, np.load(offsets_path, mmap_mode="r"))
+
+    def __getitem__(self, key):
+        return self._items[self._rows[key]]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+
+class SharedHierarchy(Mapping):
+    """
+    Drop-in for the dict loaded from alternative_hierarchy_db.json, as used by
+    the resolvers: db["product_group_db"][name]["AH PRODUCT"], etc.
+    """
+
+    def __init__(self, segment_dir: str):
+        meta = _segment_meta(segment_dir)
+        if meta is None or meta["format_version"] != SEGMENT_FORMAT_VERSION:
+            raise ValueError(f"{segment_dir} is not a published hierarchy segment")
+        self._tables = {name: SharedTable(segment_dir, name) for name in meta["tables"]}
+        self._tables.update(meta["inline"])
+
+    def __getitem__(self, name):
+        return self._tables[name]
+
+    def __iter__(self):
+        return iter(self._tables)
+
+    def __len__(self):
+        return len(self._tables)
+
+
+# one attachment per process, shared by all sessions and threads; dropped
+# with resources.invalidate("collection", dir_path) etc.
+
+
+def attach_hierarchy(json_path: str) -> SharedHierarchy:
+    return resources.resource(
+        "hierarchy", json_path, lambda: SharedHierarchy(publish_hierarchy(json_path))
+    )
+
+
+def attach_collection(dir_path: str) -> Collection:
+    def load():
+        collection = Collection(dir_path, cache=resources.embedding_cache())
+        collection.embedder = dispatching(collection.embedder)
+        return collection
+
+    return resources.resource("collection", dir_path, load)
+
+
+def attach_group_search(dir_path: str) -> GroupSearch:
+    def load():
+        search = GroupSearch.load(dir_path, cache=resources.embedding_cache())
+        search.groups.embedder = dispatching(search.groups.embedder)
+        return search
+
+    return resources.resource("group_search", dir_path, load)